@@ -0,0 +1,159 @@
+"""Rolling-origin backtests of the SARIMAX forecasts in model / model_exog.
+
+    python backtest.py data/rough_rice_yahoo.csv data/stocks/*.csv --origins 24 --step 30 --workers 4
+
+Parameters are estimated once, on the history up to the first origin. From there the
+fitted state is carried forward with ``SARIMAXResults.extend`` (a Kalman filter pass over
+just the days between two origins) instead of refitting, so an origin costs one short
+filter pass plus a forecast. Origins are split into contiguous chunks that run in
+parallel, each chunk filtering once up to its own first origin.
+"""
+import argparse, os, sys, warnings
+import numpy as np, pandas as pd
+from scipy.stats import norm
+from batch import process_pool
+from model import HORIZONS, _fit, _prepare_series, _sarimax, _spec, _tuned_spec
+from model_exog import _align_exog
+
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+MIN_TRAIN = 20  # fewest training days an origin may have
+
+def rolling_origins(n_obs, horizons=HORIZONS, n_origins=24, step=30):
+    """Positions of the last training day for each origin, oldest first; every origin leaves
+    max(horizons) days of actuals after it."""
+    last = n_obs - 1 - max(horizons)
+    return sorted(p for p in (last - step*i for i in range(n_origins)) if p >= MIN_TRAIN)
+
+def supported_horizons(n_obs, horizons=HORIZONS):
+    """The ``horizons`` a series of ``n_obs`` days leaves at least one origin for."""
+    return [h for h in horizons if n_obs - 1 - h >= MIN_TRAIN]
+
+def _score(actual, mean, var, horizons, origin_date):
+    sd = np.sqrt(var)
+    z80, z95 = norm.ppf(0.90), norm.ppf(0.975)
+    rows = []
+    for h in horizons:
+        a, m, s = actual[:h], mean[:h], sd[:h]
+        err = m - a
+        rows.append({"origin": origin_date, "h": h,
+                     "mae": float(np.mean(np.abs(err))),
+                     "mape": float(np.mean(np.abs(err / a)))*100,
+                     "cov80": float(np.mean(np.abs(err) <= z80*s)),
+                     "cov95": float(np.mean(np.abs(err) <= z95*s))})
+    return rows
+
+def _run_chunk(y, X, params, spec, origins, horizons):
+    """Score ``origins`` (ascending positions) with fixed ``params``, extending one filtered
+    state from origin to origin."""
+    max_h = max(horizons)
+    rows, res, prev = [], None, None
+    for o in origins:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            if res is None:
+                res = _sarimax(y.iloc[:o+1], spec, None if X is None else X.iloc[:o+1]).filter(params, cov_type="none")
+            else:
+                res = res.extend(y.iloc[prev+1:o+1], exog=None if X is None else X.iloc[prev+1:o+1])
+            f = res.get_forecast(steps=max_h, exog=None if X is None else X.iloc[o+1:o+1+max_h])
+        prev = o
+        rows += _score(y.to_numpy()[o+1:o+1+max_h], np.asarray(f.predicted_mean), np.asarray(f.var_pred_mean),
+                       horizons, y.index[o].date())
+    return rows
+
+def backtest_series(y, horizons=HORIZONS, n_origins=24, step=30, workers=1, X=None, pool=None, spec=None):
+    """Per-origin MAE/MAPE and 80%/95% band coverage (averaged over days 1..h) for a daily
+    series ``y``; ``X`` is an aligned exog frame, used with its realized future values.
+    ``spec`` defaults to what the app fits: the tuned orders in model.SPECS without exog,
+    the default orders with it."""
+    spec = spec or (_tuned_spec(y, "D") if X is None else _spec())
+    origins = rolling_origins(len(y), horizons, n_origins, step)
+    if not origins:
+        raise ValueError(f"{len(y)} days leave no origin for a {max(horizons)}-day horizon "
+                         f"(needs {MIN_TRAIN + 1 + max(horizons)}); try horizons {supported_horizons(len(y))}")
+    first = origins[0]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        params = np.asarray(_fit(y.iloc[:first+1], spec, None if X is None else X.iloc[:first+1]).params)
+    chunks = [c.tolist() for c in np.array_split(origins, max(1, min(workers, len(origins)))) if len(c)]
+    if pool is None or len(chunks) == 1:
+        rows = [r for c in chunks for r in _run_chunk(y, X, params, spec, c, horizons)]
+    else:
+        futs = [pool.submit(_run_chunk, y, X, params, spec, c, horizons) for c in chunks]
+        rows = [r for f in futs for r in f.result()]
+    return pd.DataFrame(rows)
+
+def backtest(date_price_df, horizons=HORIZONS, n_origins=24, step=30, workers=DEFAULT_WORKERS):
+    """Rolling-origin backtest of model.multi_forecast_ci's SARIMAX on one price frame."""
+    with process_pool(workers) as pool:
+        return backtest_series(_prepare_series(date_price_df), horizons, n_origins, step, workers, pool=pool)
+
+def backtest_exog(price_df, exog_past, horizons=None, n_origins=24, step=30, workers=DEFAULT_WORKERS, pool=None):
+    """Same for model_exog's SARIMAX with exog. Future exog is taken as observed (an oracle),
+    so this measures the model given its drivers, not the drivers' own forecasts. The exog
+    window is short (assemble_exog keeps 120 days by default), so ``horizons`` defaults to
+    the ones in HORIZONS it leaves origins for."""
+    y, X = _align_exog(price_df, exog_past)
+    horizons = horizons or supported_horizons(len(y))
+    if not horizons:
+        raise ValueError(f"{len(y)} days of exog overlap leave no origin for any of {HORIZONS}")
+    if pool is not None:
+        return backtest_series(y, horizons, n_origins, step, workers, X=X, pool=pool)
+    with process_pool(workers) as pool:
+        return backtest_series(y, horizons, n_origins, step, workers, X=X, pool=pool)
+
+def summarize(results):
+    """Mean metrics per dataset and horizon from {name: backtest frame}."""
+    frames = [r.assign(dataset=name) for name, r in results.items() if not r.empty]
+    if not frames:
+        return pd.DataFrame(columns=["dataset","h","mae","mape","cov80","cov95","origins"])
+    allr = pd.concat(frames, ignore_index=True)
+    return (allr.groupby(["dataset","h"])
+                .agg(mae=("mae","mean"), mape=("mape","mean"), cov80=("cov80","mean"),
+                     cov95=("cov95","mean"), origins=("origin","nunique"))
+                .reset_index())
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Rolling-origin backtest of SARIMAX forecasts.")
+    ap.add_argument("paths", nargs="+", help="CSV files with Date/Price columns")
+    ap.add_argument("--origins", type=int, default=24)
+    ap.add_argument("--step", type=int, default=30, help="days between origins")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    ap.add_argument("--horizons", default=None, help=f"comma-separated (default {','.join(str(h) for h in HORIZONS)}; "
+                                                   "with --exog, those the exog window supports)")
+    ap.add_argument("--exog", action="store_true", help="backtest the exogenous (news + weather) model instead")
+    ap.add_argument("--exog-days", type=int, default=120, help="days of exog history to assemble")
+    ap.add_argument("--out", default=None, help="write the per-origin rows to this CSV")
+    args = ap.parse_args(argv)
+    horizons = [int(h) for h in args.horizons.split(",") if h.strip()] if args.horizons else None
+    past = None
+    if args.exog:
+        from news_weather import assemble_exog
+        past, _, missing = assemble_exog(days_back=args.exog_days)
+        if missing:
+            print(f"exog features without: {', '.join(missing)}", file=sys.stderr)
+    results = {}
+    with process_pool(args.workers) as pool:
+        for path in args.paths:
+            name = os.path.basename(path).replace(".csv", "")
+            try:
+                df = pd.read_csv(path)
+                if past is not None:
+                    results[name] = backtest_exog(df, past, horizons, args.origins, args.step, args.workers, pool=pool)
+                else:
+                    results[name] = backtest_series(_prepare_series(df), horizons or HORIZONS, args.origins,
+                                                    args.step, args.workers, pool=pool)
+            except Exception as e:
+                print(f"FAIL {name}: {type(e).__name__}: {e}", file=sys.stderr)
+    if not results:
+        return 1
+    summary = summarize(results)
+    print(summary.round(3).to_string(index=False))
+    if len(results) > 1 and not summary.empty:
+        print()
+        print(summary.groupby("h")[["mae","mape","cov80","cov95"]].mean().round(3).to_string())
+    if args.out:
+        pd.concat([r.assign(dataset=n) for n, r in results.items()], ignore_index=True).to_csv(args.out, index=False)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Parallel multi_forecast_ci over many price CSVs.
+
+    python batch.py data/stocks/*.csv --workers 4 --timeout 600 --out forecasts
+"""
+import argparse, multiprocessing, os, sys, time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import pandas as pd
+import tracing
+from fast_models import MODELS as FAST_MODELS
+from model import HORIZONS, _prepare_series, multi_forecast_ci, multi_forecast_many
+
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+
+# Pools are created inside the multi-threaded Streamlit and HTTP server processes, where a
+# forked worker can inherit a lock another thread holds (logging, tracing) and deadlock, so
+# workers come from a fresh forkserver (spawn where that is unavailable). The forkserver
+# imports PRELOAD once, so workers forked from it start with statsmodels already loaded.
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+PRELOAD = ["model", "statsmodels.tsa.statespace.sarimax"]
+
+BatchResult = namedtuple("BatchResult", ["path", "name", "outs", "error", "seconds"])
+
+def dataset_name(path):
+    return os.path.basename(path).replace(".csv", "")
+
+def _forecast_file(path, horizons, trace=False):
+    t0 = time.perf_counter()
+    if not trace:
+        return multi_forecast_ci(pd.read_csv(path), horizons=horizons), time.perf_counter() - t0, None
+    with tracing.collect() as spans, tracing.span("batch.file", file=dataset_name(path)):
+        outs = multi_forecast_ci(pd.read_csv(path), horizons=horizons)
+    return outs, time.perf_counter() - t0, spans
+
+def _forecast_batched(paths, horizons, model):
+    """Fast models fit every file in one vectorized call, so they run in-process. Files are
+    read and prepared one by one first, so a file that fails there only fails itself."""
+    t0 = time.perf_counter()
+    frames, failed = {}, {}
+    for path in paths:
+        try:
+            frames[path] = _prepare_series(pd.read_csv(path))
+        except Exception as e:
+            failed[path] = f"{type(e).__name__}: {e}"
+    outs = multi_forecast_many(frames, horizons=horizons, model=model)
+    secs = (time.perf_counter() - t0) / max(len(paths), 1)
+    for path in paths:
+        if path in failed:
+            yield BatchResult(path, dataset_name(path), None, failed[path], secs)
+        else:
+            yield BatchResult(path, dataset_name(path), outs[path], None, secs)
+
+def process_pool(workers):
+    """ProcessPoolExecutor with ``workers`` processes started by START_METHOD."""
+    ctx = multiprocessing.get_context(START_METHOD)
+    if START_METHOD == "forkserver":
+        ctx.set_forkserver_preload(PRELOAD)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+
+def _kill(pool):
+    # Futures cannot be cancelled once running, so a timed-out fit is stopped by
+    # terminating the pool's worker processes. ProcessPoolExecutor has no public handle on
+    # them: ``_processes`` (pid -> Process) is private CPython state, and where it is missing
+    # the pool is only shut down and a timed-out fit runs on until it finishes.
+    procs = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for p in procs:
+        p.terminate()
+
+def forecast_files(paths, horizons=HORIZONS, workers=DEFAULT_WORKERS, timeout=None, model="sarimax"):
+    """Fit every CSV in ``paths`` on a pool of ``workers`` processes and yield a BatchResult per
+    file as soon as it finishes (completion order). A file that raises, or runs longer than
+    ``timeout`` seconds, yields a result with ``error`` set and does not affect the others.
+    Models other than "sarimax" (see fast_models.MODELS) are fitted in one batched call."""
+    queue = list(paths)
+    if not queue:
+        return
+    if model != "sarimax":
+        yield from _forecast_batched(queue, horizons, model)
+        return
+    workers = max(1, min(workers, len(queue)))
+    pool = process_pool(workers)
+    running = {}  # future -> (path, started)
+    try:
+        while queue or running:
+            while queue and len(running) < workers:
+                path = queue.pop(0)
+                fut = pool.submit(_forecast_file, path, horizons, tracing.enabled())
+                running[fut] = (path, time.monotonic())
+            wait_for = None
+            if timeout is not None:
+                wait_for = max(0.0, min(t for _, t in running.values()) + timeout - time.monotonic())
+            done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for fut in done:
+                path, started = running.pop(fut)
+                try:
+                    outs, secs, spans = fut.result()
+                    tracing.adopt(spans)
+                    yield BatchResult(path, dataset_name(path), outs, None, secs)
+                except Exception as e:
+                    yield BatchResult(path, dataset_name(path), None, f"{type(e).__name__}: {e}", time.monotonic() - started)
+            if timeout is None or done:
+                continue
+            now = time.monotonic()
+            expired = [f for f, (_, t) in running.items() if now - t >= timeout]
+            if not expired:
+                continue
+            for fut in expired:
+                path, started = running.pop(fut)
+                yield BatchResult(path, dataset_name(path), None, f"TimeoutError: exceeded {timeout}s", now - started)
+            # restart the pool and requeue the fits that were only collateral
+            _kill(pool)
+            queue = [p for p, _ in running.values()] + queue
+            running = {}
+            pool = process_pool(workers)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def write_forecasts(res, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for h, df in res.outs.items():
+        df.to_csv(os.path.join(out_dir, f"{res.name}_forecast_{h}d.csv"), index=False)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Forecast many price CSVs in parallel.")
+    ap.add_argument("paths", nargs="+", help="CSV files with Date/Price columns")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    ap.add_argument("--timeout", type=float, default=None, help="per-file limit in seconds")
+    ap.add_argument("--horizons", default=",".join(str(h) for h in HORIZONS))
+    ap.add_argument("--out", default=None, help="write <name>_forecast_<h>d.csv files here")
+    ap.add_argument("--model", default="sarimax", choices=["sarimax"] + sorted(FAST_MODELS))
+    args = ap.parse_args(argv)
+    horizons = [int(h) for h in args.horizons.split(",") if h.strip()]
+    failed = 0
+    for res in forecast_files(args.paths, horizons=horizons, workers=args.workers, timeout=args.timeout,
+                              model=args.model):
+        if res.error:
+            failed += 1
+            print(f"FAIL {res.name} ({res.seconds:.1f}s): {res.error}", file=sys.stderr)
+            continue
+        if args.out:
+            write_forecasts(res, args.out)
+        print(f"ok   {res.name} ({res.seconds:.1f}s)")
+    return 1 if failed and failed == len(args.paths) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
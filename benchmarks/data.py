@@ -0,0 +1,10 @@
+import numpy as np, pandas as pd
+
+def synthetic_prices(n_days=9000, seed=0, start="1990-01-02", freq="B"):
+    """Date/Price frame of a positive random walk with mild drift and a weekday pattern,
+    shaped like the Yahoo CSVs in data/ (business days only)."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=n_days, freq=freq)
+    steps = rng.normal(0.0002, 0.012, n_days) + 0.002*np.sin(2*np.pi*dates.dayofweek.to_numpy()/5)
+    price = 12.0*np.exp(np.cumsum(steps))
+    return pd.DataFrame({"Date": dates.date, "Price": np.round(price, 4)})
@@ -0,0 +1,133 @@
+"""Offline stand-ins for the HTTP sources the app talks to.
+
+``offline()`` patches yfinance, the Open-Meteo, Google News and World Bank ``requests``
+calls (the latter honouring If-None-Match) to serve deterministic fixture payloads shaped
+like the real responses, points the news/weather/World Bank caches at a scratch directory and refuses any
+other outbound connection, so benchmarks measure our code and never the network.
+"""
+import contextlib, functools, io, socket, tempfile
+from email.utils import format_datetime
+from unittest import mock
+import numpy as np, pandas as pd
+
+def yahoo_history(symbols, start=None, period=None, seed=0, n_days=6000):
+    """yfinance-style OHLC frame; a list of symbols gives (ticker, field) MultiIndex columns."""
+    end = pd.Timestamp("2026-10-15")
+    idx = pd.bdate_range(end=end, periods=n_days, name="Date")
+    if start is not None:
+        idx = idx[idx >= pd.Timestamp(start)]
+    rng = np.random.default_rng(seed)
+    def ohlc():
+        close = 20*np.exp(np.cumsum(rng.normal(0, 0.01, n_days)))[-len(idx):]
+        return pd.DataFrame({"Open": close, "High": close*1.01, "Low": close*0.99, "Close": close,
+                             "Volume": 1000}, index=idx)
+    if isinstance(symbols, str):
+        return ohlc()
+    return pd.concat({s: ohlc() for s in symbols}, axis=1)
+
+def open_meteo_json(params):
+    """Open-Meteo daily payload for an archive (start/end_date) or forecast (forecast_days) query."""
+    if "start_date" in params:
+        days = pd.date_range(params["start_date"], params["end_date"], freq="D")
+    else:
+        days = pd.date_range(pd.Timestamp.today().normalize(), periods=int(params.get("forecast_days", 16)), freq="D")
+    rng = np.random.default_rng(int(abs(float(params.get("latitude", 0)))*100))
+    return {"daily": {"time": days.strftime("%Y-%m-%d").tolist(),
+                      "temperature_2m_mean": np.round(rng.normal(28, 3, len(days)), 1).tolist(),
+                      "precipitation_sum": np.round(rng.gamma(0.6, 6, len(days)), 1).tolist()}}
+
+def news_rss(n_items=100):
+    """Google News RSS document with ``n_items`` rice headlines over the last 30 days."""
+    words = ["Rice prices climb", "Basmati exports slump", "FAO index steady", "Rough rice futures rally",
+             "Monsoon delays hurt paddy", "Thai rice demand strong", "India curbs rice exports"]
+    now = pd.Timestamp.now(tz="UTC")
+    items = []
+    for i in range(n_items):
+        pub = format_datetime((now - pd.Timedelta(hours=7*i)).to_pydatetime())
+        items.append(f"<item><title>{words[i % len(words)]} #{i}</title>"
+                     f"<link>https://news.example/rice/{i}</link><pubDate>{pub}</pubDate>"
+                     f"<description>Market update {i}: traders weigh supply and demand.</description>"
+                     f"<source url=\"https://news.example\">Example Wire</source></item>")
+    return ("<?xml version=\"1.0\"?><rss version=\"2.0\"><channel><title>rice</title>"
+            + "".join(items) + "</channel></rss>")
+
+@functools.lru_cache(maxsize=4)
+def pinksheet_xlsx(n_months=800, n_commodities=70):
+    """CMO-Historical-Data-Monthly.xlsx lookalike: a "Monthly Prices" sheet with title rows,
+    commodity names across one header row, a units row and one row per month (1960M01...)."""
+    from openpyxl import Workbook
+    names = [f"Commodity {i}" for i in range(n_commodities)]
+    names[30:34] = ["Rice, Thai 5%", "Rice, Thai 25%", "Rice, Thai A.1", "Rice, Viet Namese 5%"]
+    rng = np.random.default_rng(7)
+    wb = Workbook()
+    wb.active.title = "Description"
+    ws = wb.create_sheet("Monthly Prices")
+    ws.append(["World Bank Commodity Price Data (The Pink Sheet)"])
+    ws.append(["Monthly prices in nominal US dollars, 1960 to present"])
+    ws.append(["(monthly series are available only in nominal US dollar terms)"])
+    ws.append([])
+    ws.append([None] + names)
+    ws.append([None] + ["($/mt)"]*n_commodities)
+    prices = 100*np.exp(np.cumsum(rng.normal(0, 0.03, (n_months, n_commodities)), axis=0))
+    for m in range(n_months):
+        ws.append([f"{1960 + m//12}M{m % 12 + 1:02d}"] + np.round(prices[m], 2).tolist())
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+class _Response:
+    def __init__(self, content=b"", payload=None, headers=None, status_code=200):
+        self.content = content
+        self._payload = payload
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+class _Ticker:
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def history(self, period=None, start=None, **kwargs):
+        return yahoo_history(self.symbol, start=start, period=period)
+
+def _download(symbols, start=None, period=None, **kwargs):
+    return yahoo_history(symbols if isinstance(symbols, str) else list(symbols), start=start, period=period)
+
+def _no_network(*args, **kwargs):
+    raise RuntimeError("network access is disabled while benchmarks run offline")
+
+@contextlib.contextmanager
+def offline(cache_dir=None):
+    """Serve every external source from fixtures; yields the scratch cache directory."""
+    import fetchers, news_weather
+    rss = news_rss()
+
+    wb_headers = {"ETag": '"fixture"', "Last-Modified": "Wed, 01 Oct 2026 00:00:00 GMT"}
+
+    def http_get(url, params=None, headers=None, **kwargs):
+        if "open-meteo.com" in url:
+            return _Response(payload=open_meteo_json(params or {}))
+        if "news.google.com" in url:
+            return _Response(content=rss.encode("utf-8"))
+        if "worldbank.org" in url:
+            if (headers or {}).get("If-None-Match") == wb_headers["ETag"]:
+                return _Response(headers=wb_headers, status_code=304)
+            return _Response(content=pinksheet_xlsx(), headers=wb_headers)
+        raise RuntimeError(f"no fixture for {url}")
+
+    with contextlib.ExitStack() as stack:
+        tmp = cache_dir or stack.enter_context(tempfile.TemporaryDirectory(prefix="rice-bench-"))
+        stack.enter_context(mock.patch.object(socket, "create_connection", _no_network))
+        stack.enter_context(mock.patch("yfinance.download", _download))
+        stack.enter_context(mock.patch("yfinance.Ticker", _Ticker))
+        stack.enter_context(mock.patch.object(fetchers.requests, "get", http_get))
+        stack.enter_context(mock.patch.object(news_weather.SESSION, "get", http_get))
+        stack.enter_context(mock.patch.object(news_weather, "NEWS_CACHE_DIR", f"{tmp}/news"))
+        stack.enter_context(mock.patch.object(news_weather, "WEATHER_CACHE_DIR", f"{tmp}/weather"))
+        stack.enter_context(mock.patch.object(fetchers, "WB_CACHE_DIR", f"{tmp}/worldbank"))
+        yield tmp
@@ -0,0 +1,177 @@
+"""Offline benchmark suite for the fetch, feature and forecast hot paths.
+
+    python -m benchmarks.run                      # full sizes, print a report
+    python -m benchmarks.run --quick -k forecast  # small sizes, cases matching "forecast"
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.25
+
+Every case runs against synthetic price series and the fixture stand-ins in
+benchmarks.fixtures, so no network is needed. A case reports its best and median wall
+time over ``--repeat`` runs and the peak traced allocation of one extra run. With
+``--baseline``, cases slower than baseline * (1 + tolerance), and by more than
+``--min-delta-ms``, are flagged and the exit status is 1.
+"""
+import argparse, json, os, statistics, sys, tempfile, time, tracemalloc, warnings
+from unittest import mock
+import numpy as np, pandas as pd
+from benchmarks.data import synthetic_prices
+from benchmarks.fixtures import offline
+
+SIZES = [1000, 4000, 9000]
+QUICK_SIZES = [500, 1500]
+
+def _exog_frames(df, days=120, forward=16):
+    end = pd.Timestamp(df["Date"].iloc[-1])
+    rng = np.random.default_rng(3)
+    past_idx = pd.date_range(end - pd.Timedelta(days=days-1), end, freq="D")
+    fut_idx = pd.date_range(end + pd.Timedelta(days=1), periods=forward, freq="D")
+    mk = lambda idx: pd.DataFrame({"Date": idx.date, "temp_avg": rng.normal(28, 2, len(idx)),
+                                   "precip_avg": rng.gamma(0.6, 6, len(idx)), "news_sentiment": rng.normal(0, .3, len(idx))})
+    return mk(past_idx), mk(fut_idx)
+
+def cases(sizes):
+    """(name, setup) pairs; setup() returns the zero-argument callable that is timed."""
+    import fetchers, model, model_exog, news_weather
+    from fit_cache import FitCache
+    out = []
+    for n in sizes:
+        def prep(n=n):
+            df = synthetic_prices(n)
+            return lambda: model._prepare_series(df)
+        def fit(n=n):
+            s = model._prepare_series(synthetic_prices(n))
+            return lambda: model._fit(s)
+        def forecast(n=n):
+            df = synthetic_prices(n)
+            return lambda: model.multi_forecast_ci(df, cache=None)
+        def forecast_cached(n=n):
+            df = synthetic_prices(n)
+            cache = FitCache(tempfile.mkdtemp(prefix="rice-bench-fits-"))
+            model.multi_forecast_ci(df, cache=cache)
+            return lambda: model.multi_forecast_ci(df, cache=cache)
+        def exog(n=n):
+            df = synthetic_prices(n)
+            past, fut = _exog_frames(df)
+            return lambda: model_exog.multi_forecast_with_exog(df, past, fut)
+        out += [(f"prepare_series/{n}", prep), (f"fit/{n}", fit), (f"multi_forecast_ci/{n}", forecast),
+                (f"multi_forecast_ci_cached/{n}", forecast_cached), (f"multi_forecast_with_exog/{n}", exog)]
+
+    def fast_universe():
+        frames = {i: synthetic_prices(max(sizes), seed=i) for i in range(200)}
+        return lambda: model.multi_forecast_many(frames, model="theta")
+    def sarimax_universe():
+        frames = {i: synthetic_prices(min(sizes), seed=i) for i in range(20)}
+        return lambda: model.multi_forecast_many(frames, model="sarimax_batch")
+    def assemble_cold():
+        def run():
+            with offline():
+                news_weather.assemble_exog(days_back=120, days_forward=16)
+        return run
+    def assemble_warm():
+        tmp = tempfile.mkdtemp(prefix="rice-bench-exog-")
+        with offline(tmp):
+            news_weather.assemble_exog(days_back=120, days_forward=16)
+        def run():
+            with offline(tmp):
+                news_weather.assemble_exog(days_back=120, days_forward=16)
+        return run
+    def worldbank():
+        def run():
+            with offline() as tmp:
+                fetchers.fetch_worldbank_pinksheet_rice(os.path.join(tmp, "wb.csv"), store_dir=None)
+        return run
+    def worldbank_warm():
+        # workbook and parse cached; every call revalidates and gets a 304
+        tmp = tempfile.mkdtemp(prefix="rice-bench-wb-")
+        with offline(tmp):
+            fetchers.fetch_worldbank_pinksheet_rice(os.path.join(tmp, "wb.csv"), store_dir=None)
+        def run():
+            with offline(tmp), mock.patch.object(fetchers, "WB_RECHECK", 0):
+                fetchers.fetch_worldbank_pinksheet_rice(os.path.join(tmp, "wb.csv"), store_dir=None)
+        return run
+    def stocks_full():
+        tickers = [f"T{i}" for i in range(20)]
+        def run():
+            with offline() as tmp:
+                fetchers.fetch_stocks_to_csv(tickers, out_dir=os.path.join(tmp, "stocks"), store_dir=None)
+        return run
+    def stocks_delta():
+        tickers = [f"T{i}" for i in range(20)]
+        tmp = tempfile.mkdtemp(prefix="rice-bench-stocks-")
+        with offline(tmp):
+            fetchers.fetch_stocks_to_csv(tickers, out_dir=os.path.join(tmp, "stocks"), store_dir=None)
+        def run():
+            with offline(tmp):
+                fetchers.fetch_stocks_to_csv(tickers, out_dir=os.path.join(tmp, "stocks"), store_dir=None)
+        return run
+    out += [("multi_forecast_many_theta/200", fast_universe), ("multi_forecast_many_sarimax_batch/20", sarimax_universe),
+            ("assemble_exog/cold", assemble_cold),
+            ("assemble_exog/warm", assemble_warm), ("worldbank_pinksheet", worldbank),
+            ("worldbank_pinksheet/warm", worldbank_warm),
+            ("fetch_stocks/full", stocks_full), ("fetch_stocks/delta", stocks_delta)]
+    return out
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"best_s": min(times), "median_s": statistics.median(times), "peak_mb": peak / 2**20}
+
+def compare(results, baseline, tolerance, min_delta=0.005):
+    """Rows of (case, now, before, ratio, regressed) for cases present in both runs. A case
+    regresses when it is both ``tolerance`` relatively and ``min_delta`` seconds slower."""
+    rows = []
+    for name, r in results.items():
+        if name in baseline:
+            before = baseline[name]["best_s"]
+            ratio = r["best_s"] / before if before else float("inf")
+            rows.append((name, r["best_s"], before, ratio,
+                         ratio > 1 + tolerance and r["best_s"] - before > min_delta))
+    return rows
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline benchmarks for fetch, feature and forecast paths.")
+    ap.add_argument("-k", dest="pattern", default="", help="only cases whose name contains this")
+    ap.add_argument("--quick", action="store_true", help="small series sizes")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--baseline", help="JSON from an earlier --save to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging")
+    ap.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    ap.add_argument("--save", help="write results JSON here")
+    args = ap.parse_args(argv)
+    warnings.simplefilter("ignore")
+
+    results = {}
+    for name, setup in cases(QUICK_SIZES if args.quick else SIZES):
+        if args.pattern not in name:
+            continue
+        fn = setup()
+        # a single fit of a long series is slow enough that one timed run is plenty
+        slow = ("fit/", "multi_forecast_ci/", "multi_forecast_many_sarimax")
+        repeat = 1 if name.startswith(slow) and not args.quick else args.repeat
+        results[name] = measure(fn, repeat)
+        r = results[name]
+        print(f"{name:34s} best {r['best_s']*1000:10.1f} ms  median {r['median_s']*1000:10.1f} ms  peak {r['peak_mb']:8.1f} MB",
+              flush=True)
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        rows = compare(results, baseline, args.tolerance, args.min_delta_ms / 1000)
+        print()
+        for name, now, before, ratio, bad in rows:
+            print(f"{'REGRESSION' if bad else 'ok':10s} {name:34s} {before*1000:10.1f} -> {now*1000:10.1f} ms  x{ratio:.2f}")
+        return 1 if any(r[-1] for r in rows) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Cold-start time of the Streamlit app: module imports and the first render.
+
+    python -m benchmarks.startup                   # this tree
+    python -m benchmarks.startup --ref HEAD~1      # compare with an earlier commit
+
+Every measurement runs in a fresh interpreter. "import" is the time to import the app's
+own modules once streamlit and pandas are loaded; "first render" is one AppTest run of
+streamlit_app.py, imports included, in a scratch directory holding synthetic datasets and
+their precomputed forecasts (so it times startup rather than model fits). The heavy
+libraries loaded by the end of each are listed.
+"""
+import argparse, io, json, os, shutil, statistics, subprocess, sys, tarfile, tempfile
+from benchmarks.data import synthetic_prices
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_MODULES = ["fetchers", "model", "batch", "price_store", "news_tab", "news_weather", "materialize",
+               "model_exog", "distribution", "fast_models", "tracing"]
+HEAVY = ["statsmodels", "yfinance", "feedparser", "vaderSentiment", "scipy.stats"]
+
+_IMPORT = """
+import json, sys, time
+import streamlit, pandas
+t0 = time.perf_counter()
+for m in sys.argv[1].split(","):
+    try:
+        __import__(m)
+    except ImportError:
+        pass   # module not in this tree
+print(json.dumps({"secs": time.perf_counter() - t0,
+                  "heavy": [m for m in sys.argv[2].split(",") if m in sys.modules]}))
+"""
+
+_RENDER = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=float(sys.argv[3])).run()
+print(json.dumps({"secs": time.perf_counter() - t0, "errors": [e.message for e in at.exception],
+                  "heavy": [m for m in sys.argv[2].split(",") if m in sys.modules]}))
+"""
+
+def _probe(code, args, code_dir, cwd):
+    env = {**os.environ, "PYTHONPATH": code_dir, "RICE_TRACE": ""}
+    out = subprocess.run([sys.executable, "-c", code, *args], cwd=cwd, env=env, capture_output=True, text=True)
+    if out.returncode:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "probe failed")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def checkout(ref, dest):
+    """Extract the tree of git ``ref`` into ``dest``."""
+    tar = subprocess.run(["git", "archive", "--format=tar", ref], cwd=ROOT, capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(tar)) as tf:
+        tf.extractall(dest, filter="data")
+    return dest
+
+def scratch(dest, n=2500):
+    """Synthetic rice and stock datasets with forecasts precomputed by this tree's materialize.py."""
+    os.makedirs(os.path.join(dest, "data", "stocks"))
+    synthetic_prices(n, seed=0).to_csv(os.path.join(dest, "data", "rough_rice_yahoo.csv"), index=False)
+    for i, sym in enumerate(["ADM", "BG", "KRBL_NS"]):
+        synthetic_prices(n, seed=i + 1).to_csv(os.path.join(dest, "data", "stocks", f"{sym}.csv"), index=False)
+    shutil.copy(os.path.join(ROOT, "config.json"), dest)
+    paths = ["data/rough_rice_yahoo.csv"] + [f"data/stocks/{s}.csv" for s in ["ADM", "BG", "KRBL_NS"]]
+    subprocess.run([sys.executable, os.path.join(ROOT, "materialize.py"), *paths, "--workers", "1"],
+                   cwd=dest, env={**os.environ, "PYTHONPATH": ROOT}, check=True, capture_output=True)
+    return dest
+
+def measure(code_dir, template, repeat, timeout):
+    """best/median seconds of the import and first-render probes for the app in ``code_dir``."""
+    imports, renders = [], []
+    for i in range(repeat):
+        imports.append(_probe(_IMPORT, [",".join(APP_MODULES), ",".join(HEAVY)], code_dir, template))
+        run_dir = shutil.copytree(template, f"{template}-run{i}")   # fresh store and caches per render
+        try:
+            renders.append(_probe(_RENDER, [os.path.join(code_dir, "streamlit_app.py"), ",".join(HEAVY), str(timeout)],
+                                  code_dir, run_dir))
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+    secs = lambda rs: {"best_s": min(r["secs"] for r in rs), "median_s": statistics.median(r["secs"] for r in rs)}
+    return {"import": {**secs(imports), "heavy": imports[-1]["heavy"]},
+            "first_render": {**secs(renders), "heavy": renders[-1]["heavy"], "errors": renders[-1]["errors"]}}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Import and first-render time of streamlit_app.py.")
+    ap.add_argument("--ref", action="append", default=[], help="also measure this git revision (repeatable)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--timeout", type=float, default=600, help="seconds allowed for one render")
+    ap.add_argument("--save", help="write results JSON here")
+    args = ap.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="rice-startup-") as tmp:
+        template = scratch(os.path.join(tmp, "app"))
+        trees = [("working tree", ROOT)] + [(ref, checkout(ref, os.path.join(tmp, f"ref{i}"))) for i, ref in enumerate(args.ref)]
+        for name, code_dir in trees:
+            r = results[name] = measure(code_dir, template, args.repeat, args.timeout)
+            for part in ("import", "first_render"):
+                p = r[part]
+                print(f"{name:14s} {part:13s} best {p['best_s']*1000:8.0f} ms  median {p['median_s']*1000:8.0f} ms  "
+                      f"heavy: {', '.join(p['heavy']) or '-'}", flush=True)
+            if r["first_render"]["errors"]:
+                print(f"{name:14s} render errors: {r['first_render']['errors']}")
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Fit time and holdout accuracy for each training-window policy in model.WINDOW_POLICIES.
+
+    python -m benchmarks.window_policy [data/rough_rice_yahoo.csv] [--origins 3] [--policies full-daily,5y-business]
+
+Each origin holds out the following max(HORIZONS) days; MAE/MAPE are averaged over days
+1..h of every horizon h, and fit time is the wall time of one multi_forecast_ci call
+without the fit cache.
+"""
+import argparse, time, warnings
+import numpy as np, pandas as pd
+from model import HORIZONS, WINDOW_POLICIES, _prepare_series, multi_forecast_ci
+from benchmarks.data import synthetic_prices
+
+def holdout_origins(s, n, spacing=90):
+    last = s.index.max() - pd.Timedelta(days=max(HORIZONS))
+    return [last - pd.Timedelta(days=spacing*i) for i in range(n)]
+
+def evaluate(s, policy, origins):
+    rows = []
+    for origin in origins:
+        train = s[s.index <= origin]
+        t0 = time.perf_counter()
+        outs = multi_forecast_ci(train, horizons=HORIZONS, cache=None, policy=policy)
+        secs = time.perf_counter() - t0
+        for h, fc in outs.items():
+            actual = s.reindex(pd.DatetimeIndex(fc["date"])).to_numpy()
+            err = fc["mean"].to_numpy() - actual
+            rows.append({"origin": origin.date(), "h": h, "fit_s": secs,
+                         "mae": np.nanmean(np.abs(err)), "mape": np.nanmean(np.abs(err / actual))*100})
+    return pd.DataFrame(rows)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("csv", nargs="?", help="Date/Price CSV (default: synthetic 35-year series)")
+    ap.add_argument("--origins", type=int, default=3)
+    ap.add_argument("--policies", default=",".join(WINDOW_POLICIES))
+    args = ap.parse_args(argv)
+    warnings.simplefilter("ignore")
+    s = _prepare_series(pd.read_csv(args.csv) if args.csv else synthetic_prices())
+    origins = holdout_origins(s, args.origins)
+    summary = []
+    for name in args.policies.split(","):
+        res = evaluate(s, WINDOW_POLICIES[name], origins)
+        row = {"policy": name, "fit_s": res.groupby("origin")["fit_s"].first().mean()}
+        for h, g in res.groupby("h"):
+            row[f"mae_{h}"] = g["mae"].mean(); row[f"mape%_{h}"] = g["mape"].mean()
+        summary.append(row)
+        print(f"{name:24s} fit {row['fit_s']:7.2f}s", flush=True)
+    print(pd.DataFrame(summary).set_index("policy").round(3).to_string())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Gaussian predictive distribution of a forecast over consecutive days.
+
+    dist = model.forecast_distribution(df, horizon=365)
+    dist.quantiles([0.05, 0.25, 0.5, 0.75, 0.95])   # (5, 365) fan chart bands
+    dist.horizon(30).prob_exceeds(450.0)            # P(price > 450 on some day in 30)
+
+Mean and variance are computed once by the model; quantiles are derived from them on
+demand (and remembered per set of levels), and per-horizon views slice the same arrays
+without copying.
+"""
+import numpy as np, pandas as pd
+from scipy.special import ndtr, ndtri   # scipy.stats.norm without importing scipy.stats
+
+BANDS = {"80": 0.80, "95": 0.95}
+
+class ForecastDistribution:
+    def __init__(self, dates, mean, var):
+        self.dates = pd.DatetimeIndex(dates)
+        self.mean = np.asarray(mean, dtype=float)
+        self.var = np.maximum(np.asarray(var, dtype=float), 0.0)
+        self._sd = None
+        self._quantiles = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        """Rebuild from a multi_forecast_ci frame (date, mean, lower95, upper95, ...)."""
+        sd = (df["upper95"].to_numpy(dtype=float) - df["mean"].to_numpy(dtype=float)) / ndtri(0.975)
+        return cls(pd.to_datetime(df["date"]), df["mean"], sd**2)
+
+    def __len__(self):
+        return len(self.mean)
+
+    @property
+    def sd(self):
+        if self._sd is None:
+            self._sd = np.sqrt(self.var)
+        return self._sd
+
+    def horizon(self, h):
+        """The first ``h`` days; arrays are views of this distribution's."""
+        out = ForecastDistribution.__new__(ForecastDistribution)
+        out.dates, out.mean, out.var = self.dates[:h], self.mean[:h], self.var[:h]
+        out._sd = None if self._sd is None else self._sd[:h]
+        out._quantiles = {k: q[:, :h] for k, q in self._quantiles.items()}
+        return out
+
+    def quantiles(self, levels):
+        """Array of shape (len(levels), days) with the predictive quantile at each level."""
+        key = tuple(float(p) for p in np.atleast_1d(levels))
+        q = self._quantiles.get(key)
+        if q is None:
+            q = self.mean + ndtri(np.asarray(key))[:, None] * self.sd
+            self._quantiles[key] = q
+        return q
+
+    def interval(self, coverage):
+        lo, hi = self.quantiles([(1 - coverage) / 2, (1 + coverage) / 2])
+        return lo, hi
+
+    def frame(self, bands=BANDS):
+        """DataFrame(date, mean, lower<b>, upper<b> ...) for every band in ``bands``."""
+        cols = {"date": self.dates, "mean": self.mean}
+        for name, coverage in bands.items():
+            cols[f"lower{name}"], cols[f"upper{name}"] = self.interval(coverage)
+        return pd.DataFrame(cols)
+
+    def frames(self, horizons, bands=BANDS):
+        """dict[h] -> frame of the first h days; one frame is built and the rest are row slices."""
+        full = self.horizon(max(horizons)).frame(bands)
+        return {h: full.iloc[:h] for h in horizons}
+
+    def prob_above(self, x):
+        """Per-day probability that the price is above ``x``."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return ndtr((self.mean - x) / np.where(self.sd > 0, self.sd, np.nan))
+
+    def sample_paths(self, n, seed=None):
+        """``n`` simulated price paths, shape (n, days).
+
+        Day t's deviation from the mean is sum_j s[t-j] * z[j] over standard normal shocks z,
+        with s[k]**2 the k-th increment of the variance, which is the moving-average form of
+        an ARIMA forecast error (assuming non-negative MA weights). Paths therefore match this
+        distribution's mean and (non-decreasing) variance on each day, and shocks persist.
+        """
+        rng = np.random.default_rng(seed)
+        s = np.sqrt(np.maximum(np.diff(self.var, prepend=0.0), 0.0))
+        H = len(s)
+        lag = np.arange(H)[None, :] - np.arange(H)[:, None]   # [shock day j, path day t] -> t - j
+        weights = np.where(lag >= 0, s[np.clip(lag, 0, None)], 0.0)
+        return self.mean + rng.standard_normal((n, H)) @ weights
+
+    def prob_exceeds(self, x, n=10000, seed=0):
+        """Probability that the price goes above ``x`` on at least one day, from ``n`` paths."""
+        return float((self.sample_paths(n, seed).max(axis=1) > x).mean())
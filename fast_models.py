@@ -0,0 +1,128 @@
+"""Batched forecasting baselines over a 2-D (series x time) matrix.
+
+Every model takes ``Y`` of shape (N, T), with NaN where a series has no data yet
+(shorter histories are left-padded), the number of steps ``h`` and the seasonal
+period ``m``, and returns predictive (mean, variance) arrays of shape (N, h).
+Smoothing parameters are picked per series from a grid that is evaluated for all
+series at once, so one pass over T fits the whole universe. ``sarimax_batch`` is the
+SARIMAX spec of model.py estimated for all series together (see sarimax_batch.py).
+"""
+import numpy as np
+from sarimax_batch import sarimax_batch
+
+ALPHAS = np.linspace(0.05, 1.0, 20)
+BETAS = np.array([0.01, 0.05, 0.1, 0.2, 0.3])
+
+def stack_tail(series_list):
+    """Right-align 1-D arrays into an (N, max_len) matrix, left-padding with NaN."""
+    T = max((len(s) for s in series_list), default=0)
+    Y = np.full((len(series_list), T), np.nan)
+    for i, s in enumerate(series_list):
+        if len(s):
+            Y[i, T-len(s):] = np.asarray(s, dtype=float)
+    return Y
+
+def _first_valid(Y):
+    idx = np.argmax(np.isfinite(Y), axis=1)
+    return Y[np.arange(len(Y)), idx]
+
+def _steps(h):
+    return np.arange(1, h+1, dtype=float)
+
+def naive(Y, h, m=7):
+    last = Y[:, -1]
+    sigma2 = np.nanmean(np.diff(Y, axis=1)**2, axis=1)
+    return np.repeat(last[:, None], h, axis=1), sigma2[:, None]*_steps(h)
+
+def seasonal_naive(Y, h, m=7):
+    k = (np.arange(h) % m)
+    mean = Y[:, Y.shape[1]-m+k]
+    sigma2 = np.nanmean((Y[:, m:] - Y[:, :-m])**2, axis=1)
+    return mean, sigma2[:, None]*(np.arange(h)//m + 1)
+
+def drift(Y, h, m=7):
+    n = np.isfinite(Y).sum(axis=1)
+    slope = (Y[:, -1] - _first_valid(Y)) / np.maximum(n-1, 1)
+    d = np.diff(Y, axis=1) - slope[:, None]
+    sigma2 = np.nansum(d**2, axis=1) / np.maximum(n-2, 1)
+    H = _steps(h)
+    return Y[:, -1:] + slope[:, None]*H, sigma2[:, None]*H*(1 + H/np.maximum(n-1, 1)[:, None])
+
+def _smooth(Y, alphas, betas=None):
+    """Run simple (``betas`` None) or Holt exponential smoothing for every (alpha, beta) pair
+    and series at once. Returns level, trend and SSE arrays of shape (G, N); steps where a
+    series is NaN leave its state unchanged."""
+    N, T = Y.shape
+    a = np.asarray(alphas, dtype=float)[:, None]
+    b = np.zeros_like(a) if betas is None else np.asarray(betas, dtype=float)[:, None]
+    level = np.repeat(_first_valid(Y)[None, :], len(a), axis=0)
+    trend = np.zeros_like(level)
+    if betas is not None:
+        d0 = np.diff(Y, axis=1)
+        has = np.isfinite(d0)
+        first_d = np.where(has.any(axis=1), d0[np.arange(N), np.argmax(has, axis=1)], 0.0)
+        trend = np.repeat(first_d[None, :], len(a), axis=0)
+    sse = np.zeros_like(level)
+    for t in range(T):
+        y = Y[:, t]
+        ok = np.isfinite(y)
+        pred = level + trend
+        e = np.where(ok, y - pred, 0.0)
+        sse += e*e
+        level = np.where(ok, pred + a*e, level)
+        trend = np.where(ok, trend + a*b*e, trend)
+    return level, trend, sse
+
+def _pick(sse):
+    return np.argmin(sse, axis=0)
+
+def _ses_fit(Y):
+    level, _, sse = _smooth(Y, ALPHAS)
+    best = _pick(sse); cols = np.arange(Y.shape[0])
+    sigma2 = sse[best, cols] / np.maximum(np.isfinite(Y).sum(axis=1) - 1, 1)
+    return level[best, cols], ALPHAS[best], sigma2
+
+def ses(Y, h, m=7):
+    level, alpha, sigma2 = _ses_fit(Y)
+    H = _steps(h)
+    return np.repeat(level[:, None], h, axis=1), sigma2[:, None]*(1 + (H-1)*alpha[:, None]**2)
+
+def holt(Y, h, m=7):
+    ga, gb = np.meshgrid(ALPHAS, BETAS, indexing="ij")
+    ga, gb = ga.ravel(), gb.ravel()
+    level, trend, sse = _smooth(Y, ga, gb)
+    best = _pick(sse); cols = np.arange(Y.shape[0])
+    alpha, beta = ga[best][:, None], gb[best][:, None]
+    sigma2 = sse[best, cols] / np.maximum(np.isfinite(Y).sum(axis=1) - 2, 1)
+    H = _steps(h)
+    c2 = (alpha*(1 + H[None, :-1]*beta))**2 if h > 1 else np.zeros((len(cols), 0))
+    var = sigma2[:, None]*(1 + np.concatenate([np.zeros((len(cols), 1)), np.cumsum(c2, axis=1)], axis=1))
+    return level[best, cols][:, None] + trend[best, cols][:, None]*H, var
+
+def theta(Y, h, m=7):
+    """Theta method (Hyndman & Billah 2003): SES plus half the linear-trend slope."""
+    level, alpha, sigma2 = _ses_fit(Y)
+    ok = np.isfinite(Y)
+    n = ok.sum(axis=1)
+    t = np.where(ok, np.arange(Y.shape[1])[None, :], np.nan)
+    tc = t - np.nanmean(t, axis=1, keepdims=True)
+    yc = Y - np.nanmean(Y, axis=1, keepdims=True)
+    slope = np.nansum(tc*yc, axis=1) / np.maximum(np.nansum(tc*tc, axis=1), 1e-12)
+    H = _steps(h)
+    adj = H[None, :] - 1 + (1 - (1 - alpha[:, None])**n[:, None]) / alpha[:, None]
+    return level[:, None] + 0.5*slope[:, None]*adj, sigma2[:, None]*(1 + (H-1)*alpha[:, None]**2)
+
+MODELS = {
+    "naive": naive,
+    "seasonal_naive": seasonal_naive,
+    "drift": drift,
+    "ses": ses,
+    "holt": holt,
+    "theta": theta,
+    "sarimax_batch": sarimax_batch,
+}
+
+def register_model(name, fn):
+    """Add a batched model ``fn(Y, h, m) -> (mean, var)`` usable as multi_forecast_ci(model=name)."""
+    MODELS[name] = fn
+    return fn
@@ -1,97 +1,309 @@
 
-import io, os, re
-import pandas as pd, requests
-import yfinance as yf
+import datetime as dt, json, math, os, re, time
+import numpy as np, pandas as pd, requests
+from price_store import STORE_DIR, PriceStore, csv_symbol, source_stamp
+from tracing import span
 
+OVERLAP_DAYS = 5  # stored days re-requested on a delta fetch so late revisions overwrite them
+TAIL_BYTES = 8192  # read from the end of a CSV to find its last rows (a few hundred days)
 WB_XLSX = "https://thedocs.worldbank.org/en/doc/5d903e848db1d1b83e0ec8f744e55570-0350012021/related/CMO-Historical-Data-Monthly.xlsx"
+WB_CACHE_DIR = ".cache/worldbank"
+WB_RECHECK = 6 * 3600   # seconds before the cached workbook is revalidated with the server
+WB_HEADER = re.compile(r"^Rice\b", re.I)   # a cell of the commodity-name header row
+WB_RICE = r"^Rice,\s*Thai\s*5\s*%"
 
 def ensure_dir(path: str):
     d = os.path.dirname(path)
     if d and not os.path.exists(d):
         os.makedirs(d, exist_ok=True)
 
-def fetch_yahoo_rough_rice(out_csv="data/rough_rice_yahoo.csv", period="max", interval="1d"):
-    """Fetch daily Rough Rice futures from Yahoo Finance (ZR=F)."""
+def _csv_tail(path):
+    """{date: price} of the last rows of a Date/Price CSV, read from the end of the file; None
+    when the file is missing or has other columns."""
+    try:
+        with open(path, "rb") as fh:
+            header = fh.readline()
+            if header.strip() != b"Date,Price":
+                return None
+            start = max(len(header), fh.seek(0, os.SEEK_END) - TAIL_BYTES)
+            fh.seek(start)
+            lines = fh.read().splitlines()
+    except OSError:
+        return None
+    tail = {}
+    for line in lines[1:] if start > len(header) else lines:   # the first line of a chunk is partial
+        d, _, p = line.decode("utf-8", "replace").partition(",")
+        try:
+            tail[dt.date.fromisoformat(d.strip()[:10])] = float(p)
+        except ValueError:
+            continue
+    return tail
+
+def _last_stored_date(path):
+    """Last Date in an existing Date/Price CSV, or None when there is nothing usable."""
+    if not os.path.exists(path):
+        return None
+    tail = _csv_tail(path)
+    if tail:
+        return max(tail)
+    try:
+        d = pd.to_datetime(pd.read_csv(path, usecols=["Date"])["Date"], errors="coerce").dropna()
+    except (ValueError, pd.errors.EmptyDataError):
+        return None
+    return d.max().date() if not d.empty else None
+
+def _delta_start(last):
+    return last - dt.timedelta(days=OVERLAP_DAYS) if last else None
+
+def _append_csv(path, new):
+    """Merge Date/Price rows into ``path``, newer rows winning on duplicate dates, and return
+    how many rows were added or revised. Rows past the stored end are appended; the file is
+    only rewritten when an overlapping day changed."""
+    new = new[["Date","Price"]].copy()
+    new["Date"] = pd.to_datetime(new["Date"], errors="coerce").dt.date
+    new = new.dropna().drop_duplicates("Date", keep="last").sort_values("Date")
+    if new.empty:
+        return 0
+    tail = _csv_tail(path)
+    if tail is not None and (not tail or new["Date"].iloc[0] >= min(tail)):
+        last = max(tail) if tail else None
+        overlap = new[new["Date"] <= last] if last else new.iloc[:0]
+        if all(d in tail and math.isclose(p, tail[d], rel_tol=1e-12) for d, p in zip(overlap["Date"], overlap["Price"])):
+            add = new[new["Date"] > last] if last else new
+            if not add.empty:
+                with open(path, "rb+") as fh:
+                    fh.seek(-1, os.SEEK_END)
+                    if fh.read(1) != b"\n":
+                        fh.write(b"\n")
+                    fh.write(add.to_csv(header=False, index=False).encode("utf-8"))
+            return len(add)
+    try:
+        old = pd.read_csv(path)
+    except (OSError, pd.errors.EmptyDataError):
+        old = pd.DataFrame(columns=["Date","Price"])
+    old["Date"] = pd.to_datetime(old["Date"], errors="coerce").dt.date
+    old = old.dropna(subset=["Date"]).drop_duplicates("Date", keep="last")
+    same = new.merge(old[["Date","Price"]], on="Date", how="left", suffixes=("", "_stored"))
+    changed = int((~np.isclose(same["Price"], pd.to_numeric(same["Price_stored"]), rtol=1e-12, atol=0)).sum())
+    if changed:
+        merged = pd.concat([old[["Date","Price"]], new], ignore_index=True)
+        merged = merged.drop_duplicates("Date", keep="last").sort_values("Date")
+        merged.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+    return changed
+
+def _to_store(paths, store_dir, deltas=None):
+    """Mirror freshly written CSVs into the columnar price store (``store_dir=None`` skips it).
+    ``deltas`` maps a path to (its stamp before the append, the appended rows)."""
+    if store_dir and paths:
+        with span("store.import", files=len(paths)):
+            store = PriceStore(store_dir)
+            if deltas:
+                store.extend({csv_symbol(p): deltas[p] for p in paths if p in deltas},
+                             {csv_symbol(p): p for p in paths if p in deltas})
+            store.import_csv([p for p in paths if not deltas or p not in deltas])
+
+def _close_frame(df, ticker=None):
+    """Date/Price frame from a yfinance result; ``ticker`` picks one symbol out of a batched download."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=["Date","Price"])
+    if isinstance(df.columns, pd.MultiIndex):
+        if ticker in df.columns.get_level_values(0):
+            df = df[ticker]
+        elif ticker in df.columns.get_level_values(-1):
+            df = df.xs(ticker, axis=1, level=-1)
+        else:
+            return pd.DataFrame(columns=["Date","Price"])
+    out = df[["Close"]].dropna().reset_index()
+    out.columns = ["Date","Price"]
+    out["Date"] = pd.to_datetime(out["Date"]).dt.date
+    return out
+
+def fetch_yahoo_rough_rice(out_csv="data/rough_rice_yahoo.csv", period="max", interval="1d", incremental=True,
+                           store_dir=STORE_DIR):
+    """Fetch daily Rough Rice futures from Yahoo Finance (ZR=F).
+
+    With ``incremental`` and an existing CSV, only the days since its last date are
+    downloaded and appended."""
     ensure_dir(out_csv)
-    t = yf.Ticker("ZR=F")
-    df = t.history(period=period, interval=interval, auto_adjust=False)
-    if df.empty:
-        df = yf.download("ZR=F", period=period, interval=interval, progress=False)
-    if df.empty:
+    start = _delta_start(_last_stored_date(out_csv)) if incremental else None
+    window = {"start": start.isoformat()} if start else {"period": period}
+    with span("fetch.yahoo_rough_rice", incremental=bool(start)) as sp:
+        import yfinance as yf
+        t = yf.Ticker("ZR=F")
+        df = t.history(interval=interval, auto_adjust=False, **window)
+        if df.empty:
+            sp.incr("retries")
+            df = yf.download("ZR=F", interval=interval, progress=False, auto_adjust=False, **window)
+        out = _close_frame(df, "ZR=F")
+        sp.set(rows=len(out))
+    if start:
+        before = source_stamp(out_csv)
+        if _append_csv(out_csv, out):
+            _to_store([out_csv], store_dir, {out_csv: (before, out)})
+        return out_csv
+    if out.empty:
         pd.DataFrame(columns=["Date","Price"]).to_csv(out_csv, index=False); return out_csv
-    out = df[["Close"]].reset_index().rename(columns={"Date":"Date","Close":"Price"})
-    out["Date"] = pd.to_datetime(out["Date"]).dt.date
     out.to_csv(out_csv, index=False)
+    _to_store([out_csv], store_dir)
     return out_csv
 
-def fetch_worldbank_pinksheet_rice(out_csv="data/rice_wb_thai5.csv"):
-    """Download World Bank Pink Sheet, extract Thai 5% broken rice monthly series."""
-    ensure_dir(out_csv)
-    r = requests.get(WB_XLSX, timeout=60); r.raise_for_status()
-    xls = pd.ExcelFile(io.BytesIO(r.content))
-    # pick a monthly sheet
-    sheet = [s for s in xls.sheet_names if "Monthly" in s or "monthly" in s]
-    sheet = sheet[0] if sheet else xls.sheet_names[0]
-    df = xls.parse(sheet, header=None)
-
-    # locate row containing rice descriptor
-    row_idx = None
-    for i in range(min(200, len(df))):
-        row = " ".join(str(x) for x in df.iloc[i].tolist())
-        if re.search(r"Rice\s*\(Thailand\).*(5%|5 %).*broken", row, flags=re.I):
-            row_idx = i; break
-    if row_idx is None:
-        pd.DataFrame(columns=["Date","Price"]).to_csv(out_csv, index=False); return out_csv
+def _read_json(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
 
-    # locate header row with years
-    header_row = None
-    for j in range(row_idx-5, row_idx+5):
-        if j < 0: continue
-        vals = df.iloc[j].tolist()
-        if any(str(v).strip().isdigit() and len(str(v))==4 for v in vals):
-            header_row = j; break
-    if header_row is None: header_row = max(row_idx-1, 0)
-
-    wide = xls.parse(sheet, header=header_row)
-    mask = wide.iloc[:,0].astype(str).str.contains("Rice", case=False, na=False) & \
-           wide.iloc[:,0].astype(str).str.contains("Thailand", case=False, na=False) & \
-           wide.iloc[:,0].astype(str).str.contains("5", na=False)
-    series_row = wide[mask]
-    if series_row.empty:
-        pd.DataFrame(columns=["Date","Price"]).to_csv(out_csv, index=False); return out_csv
+def _write_atomic(path, data, mode="wb"):
+    ensure_dir(path)
+    with open(path + ".tmp", mode) as fh:
+        fh.write(data)
+    os.replace(path + ".tmp", path)
 
-    series = series_row.squeeze()
-    tidy = series.to_frame(name="Price").reset_index().rename(columns={"index":"Period"})
-    def parse_period(x):
-        s = str(x)
-        import re as _re, datetime as _dt
-        m = _re.match(r"(\d{4})[^\d]?(\d{1,2})$", s) or _re.match(r"(\d{4})M(\d{1,2})", s) or _re.match(r"(\d{4})-(\d{1,2})", s)
-        if m:
-            y, mth = int(m.group(1)), int(m.group(2)); return _dt.date(y, mth, 1)
-        try:
-            d = pd.to_datetime(s, errors="raise"); return d.date().replace(day=1)
-        except Exception:
-            return None
-    tidy["Date"] = tidy["Period"].map(parse_period)
-    tidy = tidy.dropna(subset=["Date"])
-    tidy["Price"] = pd.to_numeric(tidy["Price"], errors="coerce")
-    tidy = tidy.dropna(subset=["Price"]).sort_values("Date")[["Date","Price"]]
+def _download_pinksheet(cache_dir):
+    """Path of the cached CMO workbook and whether it changed, revalidating it with
+    If-None-Match / If-Modified-Since at most every ``WB_RECHECK`` seconds."""
+    raw, meta_path = os.path.join(cache_dir, "CMO-Historical-Data-Monthly.xlsx"), os.path.join(cache_dir, "raw.json")
+    meta = _read_json(meta_path) if os.path.exists(raw) else {}
+    if meta and time.time() - meta.get("checked", 0) < WB_RECHECK:
+        return raw, False
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    with span("fetch.worldbank_download", conditional=bool(headers)) as sp:
+        r = requests.get(WB_XLSX, headers=headers, timeout=60)
+        sp.set(status=r.status_code)
+        changed = r.status_code != 304
+        if changed:
+            r.raise_for_status()
+            sp.set(bytes=len(r.content))
+            _write_atomic(raw, r.content)
+            meta = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+    _write_atomic(meta_path, json.dumps({**meta, "checked": time.time()}), "w")
+    return raw, changed
+
+def _period_date(x):
+    m = re.match(r"^(\d{4})\s*M(\d{1,2})$", str(x).strip())
+    return dt.date(int(m.group(1)), int(m.group(2)), 1) if m else None
+
+def parse_pinksheet(path):
+    """Monthly prices of every commodity in a CMO workbook as one wide frame (Date plus one
+    column per commodity), read in a single streaming pass over the "Monthly Prices" sheet:
+    rows before the commodity header are skipped and the pass stops at the first non-month
+    row after the data."""
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = [n for n in wb.sheetnames if "monthly" in n.lower()]
+        ws = wb[next((n for n in sheets if "price" in n.lower()), sheets[0] if sheets else wb.sheetnames[0])]
+        names, dates, rows = None, [], []
+        for row in ws.iter_rows(values_only=True):
+            if names is None:
+                if any(isinstance(v, str) and WB_HEADER.search(v) for v in row):
+                    names = {i: str(v).strip() for i, v in enumerate(row) if v is not None and str(v).strip()}
+                continue
+            d = _period_date(row[0]) if row else None
+            if d is None:
+                if dates:
+                    break
+                continue  # units row between the header and the first month
+            dates.append(d)
+            rows.append([row[i] if i < len(row) else None for i in names])
+    finally:
+        wb.close()
+    if names is None:
+        return pd.DataFrame(columns=["Date"])
+    wide = pd.DataFrame(rows, columns=list(names.values())).apply(pd.to_numeric, errors="coerce")
+    wide = wide.loc[:, ~wide.columns.duplicated()]
+    wide.insert(0, "Date", dates)
+    return wide
+
+def fetch_worldbank_pinksheet(cache_dir=None):
+    """All Pink Sheet monthly commodity prices (see parse_pinksheet). The workbook is only
+    downloaded when the server reports a new version, and its parse is cached next to it,
+    so an unchanged month is served from ``cache_dir`` without touching the xlsx."""
+    cache_dir = cache_dir or WB_CACHE_DIR
+    raw, changed = _download_pinksheet(cache_dir)
+    tidy = os.path.join(cache_dir, "monthly_prices.csv")
+    if not changed and os.path.exists(tidy):
+        with span("worldbank.tidy_cache"):
+            wide = pd.read_csv(tidy)
+            wide["Date"] = pd.to_datetime(wide["Date"]).dt.date
+            return wide
+    with span("worldbank.parse") as sp:
+        wide = parse_pinksheet(raw)
+        sp.set(rows=len(wide), commodities=wide.shape[1] - 1)
+    ensure_dir(tidy)
+    wide.to_csv(tidy + ".tmp", index=False)
+    os.replace(tidy + ".tmp", tidy)
+    return wide
+
+def pinksheet_column(columns, commodity):
+    """Column for ``commodity``: an exact name, else the first case-insensitive regex match."""
+    if commodity in columns:
+        return commodity
+    return next((c for c in columns if c != "Date" and re.search(commodity, c, flags=re.I)), None)
+
+def fetch_worldbank_pinksheet_commodity(commodity, out_csv, store_dir=STORE_DIR, cache_dir=None):
+    """Write one Pink Sheet commodity (see pinksheet_column) as a monthly Date/Price CSV."""
+    ensure_dir(out_csv)
+    wide = fetch_worldbank_pinksheet(cache_dir)
+    col = pinksheet_column(wide.columns, commodity)
+    if col is None:
+        pd.DataFrame(columns=["Date","Price"]).to_csv(out_csv, index=False); return out_csv
+    tidy = wide[["Date", col]].rename(columns={col: "Price"}).dropna(subset=["Price"]).sort_values("Date")
     tidy.to_csv(out_csv, index=False)
+    _to_store([out_csv], store_dir)
     return out_csv
 
-def fetch_stocks_to_csv(tickers, out_dir="data/stocks", period="max", interval="1d"):
-    """Fetch Adjusted Close for tickers; returns dict ticker->path. Skips tickers with no data."""
+def fetch_worldbank_pinksheet_rice(out_csv="data/rice_wb_thai5.csv", store_dir=STORE_DIR, cache_dir=None):
+    """World Bank Pink Sheet Thai 5% broken rice monthly series."""
+    return fetch_worldbank_pinksheet_commodity(WB_RICE, out_csv, store_dir=store_dir, cache_dir=cache_dir)
+
+def stock_csv_path(ticker, out_dir="data/stocks"):
+    return os.path.join(out_dir, f"{ticker.replace('.','_')}.csv")
+
+def fetch_stocks_to_csv(tickers, out_dir="data/stocks", period="max", interval="1d", incremental=True,
+                        store_dir=STORE_DIR):
+    """Fetch Adjusted Close for tickers; returns dict ticker->path of the CSVs that gained or
+    revised rows. Skips tickers with no new data.
+
+    Tickers are downloaded in multi-symbol batches: one with ``period`` for tickers that
+    have no CSV yet and, with ``incremental``, one per distinct resume date for the rest,
+    whose new rows are appended to their existing CSVs. Written CSVs are mirrored into the
+    price store at ``store_dir``."""
+    import yfinance as yf
     os.makedirs(out_dir, exist_ok=True)
-    out = {}
+    tickers = list(dict.fromkeys(tickers))
+    batches = {}
     for t in tickers:
-        try:
-            df = yf.download(t, period=period, interval=interval, auto_adjust=True, progress=False)
-            if df.empty: continue
-            dfo = df[["Close"]].reset_index().rename(columns={"Date":"Date","Close":"Price"})
-            dfo["Date"] = pd.to_datetime(dfo["Date"]).dt.date
-            path = os.path.join(out_dir, f"{t.replace('.','_')}.csv")
-            dfo.to_csv(path, index=False)
-            out[t] = path
-        except Exception:
-            continue
+        start = _delta_start(_last_stored_date(stock_csv_path(t, out_dir))) if incremental else None
+        batches.setdefault(start, []).append(t)
+    out, deltas = {}, {}
+    for start, group in batches.items():
+        window = {"start": start.isoformat()} if start else {"period": period}
+        with span("yf.download", symbols=len(group), incremental=bool(start)) as sp:
+            try:
+                df = yf.download(group, interval=interval, auto_adjust=True, progress=False,
+                                 group_by="ticker", threads=True, **window)
+                sp.set(rows=len(df))
+            except Exception as e:
+                sp.set(failed=type(e).__name__)
+                df = None
+        for t in group:
+            path = stock_csv_path(t, out_dir)
+            try:
+                new = _close_frame(df, t)
+            except Exception:
+                continue
+            if start:
+                before = source_stamp(path)
+                if _append_csv(path, new):
+                    out[t], deltas[path] = path, (before, new)
+            elif not new.empty:
+                new.to_csv(path, index=False); out[t] = path
+    _to_store(out.values(), store_dir, deltas)
     return out
@@ -0,0 +1,147 @@
+import hashlib, json, os, tempfile
+import numpy as np, pandas as pd
+
+def series_key(series: pd.Series, spec: dict) -> str:
+    """Content hash of a prepared series plus the model spec that will be fitted to it."""
+    h = hashlib.sha1()
+    h.update(json.dumps(spec, sort_keys=True, default=str).encode("utf-8"))
+    idx = series.index
+    if isinstance(idx, pd.DatetimeIndex):
+        idx = idx.as_unit("ns")  # CSV and store frames parse to different resolutions
+    h.update(np.ascontiguousarray(idx.asi8).tobytes())
+    h.update(np.ascontiguousarray(series.to_numpy(dtype=float)).tobytes())
+    return h.hexdigest()
+
+def lineage_key(series: pd.Series, spec: dict, head=30) -> str:
+    """Identity of a series across daily appends: the spec, start date and first ``head`` values."""
+    return "lin-" + series_key(series.iloc[:head], spec)
+
+class FitCache:
+    """On-disk store of fitted parameter vectors and forecast moments, one .npz per key.
+
+    Entries are evicted least-recently-used first once there are more than
+    ``max_entries`` files or they take more than ``max_bytes`` on disk; recency is
+    the file mtime, which is bumped on every hit so it survives restarts.
+    """
+
+    def __init__(self, path=".cache/fits", max_entries=256, max_bytes=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.npz")
+
+    def get(self, key):
+        """Return dict of arrays (plus ``meta`` dict) for ``key`` or None."""
+        f = self._file(key)
+        try:
+            with np.load(f, allow_pickle=False) as z:
+                out = {k: z[k] for k in z.files}
+            os.utime(f)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        out["meta"] = json.loads(str(out["meta"])) if "meta" in out else {}
+        self.hits += 1
+        return out
+
+    def put(self, key, meta=None, **arrays):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                np.savez(fh, meta=np.array(json.dumps(meta or {}, default=str)), **arrays)
+            os.replace(tmp, self._file(key))
+            self._evict()
+        except OSError:
+            pass  # read-only deployments just run uncached
+
+    def _entries(self):
+        try:
+            names = [n for n in os.listdir(self.path) if n.endswith(".npz")]
+        except OSError:
+            return []
+        ents = []
+        for n in names:
+            try:
+                st = os.stat(os.path.join(self.path, n))
+            except OSError:
+                continue
+            ents.append((st.st_mtime, st.st_size, n))
+        return sorted(ents)
+
+    def _evict(self):
+        ents = self._entries()
+        total = sum(e[1] for e in ents)
+        while ents and (len(ents) > self.max_entries or (self.max_bytes is not None and total > self.max_bytes)):
+            _, size, n = ents.pop(0)
+            try:
+                os.remove(os.path.join(self.path, n))
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        for _, _, n in self._entries():
+            try:
+                os.remove(os.path.join(self.path, n))
+            except OSError:
+                pass
+
+    def stats(self):
+        ents = self._entries()
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(ents), "bytes": sum(e[1] for e in ents)}
+
+def spec_key(series: pd.Series, freq: str) -> str:
+    """Identity of a series (as in lineage_key) for storing its tuned spec at ``freq``."""
+    return lineage_key(series, {"freq": freq})[4:]
+
+class SpecStore:
+    """Tuned SARIMAX orders per series in one JSON file (``spec_key`` -> entry with "order",
+    "seasonal_order", "searched" date and search details). The file is re-read when it
+    changes on disk, so other processes see a new search without restarting."""
+
+    def __init__(self, path="data/specs.json"):
+        self.path = path
+        self._entries = {}
+        self._stamp = None
+
+    def _load(self):
+        try:
+            stamp = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self._entries, self._stamp = {}, None
+            return self._entries
+        if stamp != self._stamp:
+            try:
+                with open(self.path) as fh:
+                    self._entries = json.load(fh)
+            except (OSError, ValueError):
+                self._entries = {}
+            self._stamp = stamp
+        return self._entries
+
+    def get(self, key):
+        return self._load().get(key)
+
+    def put_many(self, entries):
+        merged = {**self._load(), **entries}
+        try:
+            d = os.path.dirname(self.path) or "."
+            os.makedirs(d, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+            with os.fdopen(fd, "w") as fh:
+                json.dump(merged, fh, indent=1, sort_keys=True, default=str)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+        self._entries, self._stamp = merged, None
+
+    def put(self, key, entry):
+        self.put_many({key: entry})
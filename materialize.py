@@ -0,0 +1,153 @@
+"""Precompute forecasts for every dataset so the app can serve them without fitting.
+
+    python materialize.py data/*.csv data/stocks/*.csv --exog data/*.csv --workers 4 --timeout 900
+
+Each dataset gets ``forecasts/<name>/<variant>.csv`` (all horizons in long form) and a
+``<variant>.json`` with its metadata: the hash of the price series it was fitted on, the
+model spec, fit time and creation time. ``load_forecasts`` returns the stored frames only
+while that metadata still matches the current data and spec, otherwise None.
+"""
+import argparse, datetime as dt, json, os, sys, time
+import pandas as pd
+from batch import DEFAULT_WORKERS, dataset_name, forecast_files
+from fit_cache import series_key
+from model import DEFAULT_POLICY, HORIZONS, _prepare_series, _spec, resolve_spec
+
+ARTIFACT_DIR = "forecasts"
+SCHEMA = 1
+EXOG_MAX_AGE = 36 * 3600   # exog forecasts also depend on the day's news and weather
+COLS = ["date","mean","lower80","upper80","lower95","upper95"]
+
+def model_spec(price_df, variant="plain", policy=DEFAULT_POLICY):
+    """Spec a forecast of ``price_df`` is fitted with; plain forecasts use the tuned orders."""
+    base = resolve_spec(price_df, policy) if variant == "plain" else _spec(policy.freq)
+    return {**base, "policy": policy._asdict(), "exog": variant == "exog"}
+
+def data_hash(price_df):
+    """Content hash of the daily price series a forecast is fitted on."""
+    s = _prepare_series(price_df)
+    return series_key(s, {}) if len(s) else "empty"
+
+def _paths(name, variant, out_dir):
+    base = os.path.join(out_dir, name, variant)
+    return base + ".csv", base + ".json"
+
+def save_forecasts(name, variant, outs, price_df, fit_seconds, out_dir=ARTIFACT_DIR):
+    """Write one dataset's forecasts and metadata; the JSON is replaced last, so readers
+    never see metadata for a CSV that is not fully written."""
+    csv_path, meta_path = _paths(name, variant, out_dir)
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    s = _prepare_series(price_df)
+    long = pd.concat([df.reindex(columns=COLS).assign(horizon=h) for h, df in outs.items()], ignore_index=True)
+    long[["horizon"] + COLS].to_csv(csv_path + ".tmp", index=False)
+    os.replace(csv_path + ".tmp", csv_path)
+    meta = {"schema": SCHEMA, "name": name, "variant": variant, "data_hash": data_hash(price_df),
+            "last_date": str(s.index.max().date()) if len(s) else None, "nobs": len(s),
+            "spec": model_spec(price_df, variant), "horizons": sorted(int(h) for h in outs),
+            "fit_seconds": round(float(fit_seconds), 3), "created": dt.datetime.now(dt.timezone.utc).isoformat()}
+    with open(meta_path + ".tmp", "w") as fh:
+        json.dump(meta, fh, indent=2, default=str)
+    os.replace(meta_path + ".tmp", meta_path)
+    return meta
+
+def read_meta(name, variant="plain", out_dir=ARTIFACT_DIR):
+    try:
+        with open(_paths(name, variant, out_dir)[1]) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+def stale_reason(meta, price_df, variant="plain", horizons=HORIZONS):
+    """Why ``meta`` cannot be served for ``price_df`` (a short string), or None if it can."""
+    if meta is None:
+        return "missing"
+    if meta.get("schema") != SCHEMA:
+        return "schema"
+    if not set(horizons) <= set(meta.get("horizons", [])):
+        return "horizons"
+    if meta.get("spec") != json.loads(json.dumps(model_spec(price_df, variant), default=str)):
+        return "spec"
+    if meta.get("data_hash") != data_hash(price_df):
+        return "data"
+    if variant == "exog":
+        age = dt.datetime.now(dt.timezone.utc) - dt.datetime.fromisoformat(meta["created"])
+        if age.total_seconds() > EXOG_MAX_AGE:
+            return "age"
+    return None
+
+def load_forecasts(name, price_df, variant="plain", horizons=HORIZONS, out_dir=ARTIFACT_DIR):
+    """dict[h] -> forecast frame from the stored artifact, or None when it is missing or stale."""
+    meta = read_meta(name, variant, out_dir)
+    if stale_reason(meta, price_df, variant, horizons) is not None:
+        return None
+    try:
+        long = pd.read_csv(_paths(name, variant, out_dir)[0], parse_dates=["date"])
+    except (OSError, ValueError, pd.errors.EmptyDataError):
+        return None
+    return {h: long.loc[long["horizon"] == h, COLS].reset_index(drop=True) for h in horizons}
+
+def materialize(paths, exog_paths=(), horizons=HORIZONS, workers=DEFAULT_WORKERS, timeout=None,
+                out_dir=ARTIFACT_DIR, force=False):
+    """Fit and store plain forecasts for ``paths`` and exog forecasts for ``exog_paths``,
+    skipping datasets whose artifact is still current unless ``force``. Yields
+    (name, variant, status) with status "ok", "fresh" or an error message."""
+    todo = []
+    for path in paths:
+        if not force and stale_reason(read_meta(dataset_name(path), "plain", out_dir), pd.read_csv(path)) is None:
+            yield dataset_name(path), "plain", "fresh"
+        else:
+            todo.append(path)
+    for res in forecast_files(todo, horizons=horizons, workers=workers, timeout=timeout):
+        if res.error:
+            yield res.name, "plain", res.error
+            continue
+        save_forecasts(res.name, "plain", res.outs, pd.read_csv(res.path), res.seconds, out_dir)
+        yield res.name, "plain", "ok"
+    if not exog_paths:
+        return
+    from model_exog import multi_forecast_with_exog
+    from news_weather import assemble_exog
+    try:
+        past, future, missing = assemble_exog(days_back=120, days_forward=16)
+    except Exception as e:
+        for path in exog_paths:
+            yield dataset_name(path), "exog", f"features: {type(e).__name__}: {e}"
+        return
+    if missing:
+        print(f"exog features without: {', '.join(missing)}", file=sys.stderr)
+    for path in exog_paths:
+        name, df = dataset_name(path), pd.read_csv(path)
+        if not force and stale_reason(read_meta(name, "exog", out_dir), df, "exog") is None:
+            yield name, "exog", "fresh"
+            continue
+        t0 = time.perf_counter()
+        try:
+            outs = multi_forecast_with_exog(df, past, future, horizons=horizons)
+        except Exception as e:
+            yield name, "exog", f"{type(e).__name__}: {e}"
+            continue
+        save_forecasts(name, "exog", outs, df, time.perf_counter() - t0, out_dir)
+        yield name, "exog", "ok"
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Precompute forecast artifacts for the app.")
+    ap.add_argument("paths", nargs="+", help="CSV files with Date/Price columns")
+    ap.add_argument("--exog", nargs="*", default=[], help="also store exogenous (news + weather) forecasts for these")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    ap.add_argument("--timeout", type=float, default=None, help="per-file limit in seconds")
+    ap.add_argument("--out", default=ARTIFACT_DIR)
+    ap.add_argument("--force", action="store_true", help="refit even when an artifact is current")
+    args = ap.parse_args(argv)
+    failed = total = 0
+    for name, variant, status in materialize(args.paths, args.exog, workers=args.workers, timeout=args.timeout,
+                                             out_dir=args.out, force=args.force):
+        total += 1
+        if status not in ("ok", "fresh"):
+            failed += 1
+            print(f"FAIL {name} [{variant}]: {status}", file=sys.stderr)
+        else:
+            print(f"{status:6s}{name} [{variant}]")
+    return 1 if failed and failed == total else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,38 @@
 
-import pandas as pd
-from statsmodels.tsa.statespace.sarimax import SARIMAX
+import os, time
+from collections import namedtuple
+import numpy as np, pandas as pd
+from distribution import ForecastDistribution
+from fast_models import MODELS as FAST_MODELS, stack_tail
+from fit_cache import FitCache, SpecStore, lineage_key, series_key, spec_key
+from tracing import span, traced
 
 HORIZONS = [7, 30, 180, 365]
 PRICE_CANDIDATES = ["price","close","adj close","adj_close","settle","value","last","rate"]
 DATE_CANDIDATES  = ["date","timestamp","time"]
+ORDER = (1,1,1)
+SEASONAL_ORDER = (0,1,1,7)
+FIT_CACHE = FitCache(os.environ.get("RICE_FIT_CACHE", ".cache/fits"))
+SPECS = SpecStore(os.environ.get("RICE_SPECS", "data/specs.json"))   # tuned orders, see order_search.py
+REFIT_EVERY = 30        # appended days before parameters are re-estimated
+DRIFT_THRESHOLD = 4.0   # mean squared standardized one-step error on appended days that forces a refit
+SEASONAL_PERIODS = {"D": 7, "B": 5}
+
+# How much history a fit sees and at what frequency. ``max_lookback_days`` trims the daily
+# series (None keeps all of it), ``freq`` is "D" (calendar days, weekly season 7) or "B"
+# (business days, season 5), and horizons >= ``weekly_from`` are fitted on weekly prices
+# (non-seasonal) and interpolated back to daily dates.
+WindowPolicy = namedtuple("WindowPolicy", ["max_lookback_days", "freq", "weekly_from"], defaults=[None, "D", None])
+DEFAULT_POLICY = WindowPolicy()
+WINDOW_POLICIES = {
+    "full-daily": DEFAULT_POLICY,
+    "10y-daily": WindowPolicy(10*365),
+    "5y-daily": WindowPolicy(5*365),
+    "5y-business": WindowPolicy(5*365, "B"),
+    "3y-business": WindowPolicy(3*365, "B"),
+    "5y-business-weekly180": WindowPolicy(5*365, "B", 180),
+    "3y-business-weekly180": WindowPolicy(3*365, "B", 180),
+}
 
 def _find_col(cols, candidates):
     cl = [c.lower() for c in cols]
@@ -13,9 +41,13 @@ def _find_col(cols, candidates):
             return cols[cl.index(cand)]
     return None
 
+@traced("prepare_series")
 def _prepare_series(df: pd.DataFrame):
     if df is None or df.empty:
         return pd.Series(dtype=float)
+    if isinstance(df, pd.Series):
+        # already normalized (e.g. PriceStore.series): sorted, one row per date
+        return df.astype(float).asfreq("D").ffill()
     price_col = _find_col(df.columns, PRICE_CANDIDATES) or df.columns[-1]
     date_col  = _find_col(df.columns, DATE_CANDIDATES)  or df.columns[0]
     s = df.copy()
@@ -27,48 +59,223 @@ def _prepare_series(df: pd.DataFrame):
     s = s.sort_values(date_col).set_index(date_col)[price_col].astype(float)
     return s.asfreq("D").ffill()
 
-def _fit(series):
-    return SARIMAX(series, order=(1,1,1), seasonal_order=(0,1,1,7),
-                   enforce_stationarity=False, enforce_invertibility=False).fit(disp=False)
+def _spec(freq="D"):
+    if freq == "W":
+        seasonal = (0, 0, 0, 0)
+    else:
+        seasonal = SEASONAL_ORDER[:3] + (SEASONAL_PERIODS.get(freq, SEASONAL_ORDER[3]),)
+    return {"model": "sarimax", "order": ORDER, "seasonal_order": seasonal, "freq": freq}
 
-def multi_forecast_ci(date_price_df: pd.DataFrame, horizons=HORIZONS):
-    """Returns dict[h] -> DataFrame(date, mean, lower80, upper80, lower95, upper95)"""
-    s = _prepare_series(date_price_df)
-    out = {}
-    if s.empty:
-        for h in horizons:
-            out[h] = pd.DataFrame(columns=["date","mean","lower80","upper80","lower95","upper95"])
-        return out
-    if len(s) < 20:
-        last = float(s.iloc[-1])
-        for h in horizons:
-            idx = pd.date_range(s.index.max(), periods=h, freq="D")
-            base = pd.DataFrame({"date": idx})
-            base["mean"] = last
-            base["lower80"] = last; base["upper80"] = last
-            base["lower95"] = last; base["upper95"] = last
-            out[h] = base
-        return out
-
-    max_h = max(horizons)
-    m95 = _fit(s)
-    f95 = m95.get_forecast(steps=max_h, alpha=0.05)
-    mean = f95.predicted_mean; ci95 = f95.conf_int(alpha=0.05)
-
-    f80 = m95.get_forecast(steps=max_h, alpha=0.20)
-    ci80 = f80.conf_int(alpha=0.20)
+def _tuned_spec(s, freq="D", specs=SPECS):
+    """_spec(freq) with the order and seasonal order stored for ``s`` in ``specs``, if any."""
+    spec = _spec(freq)
+    hit = specs.get(spec_key(s, freq)) if specs is not None and len(s) else None
+    if hit is not None:
+        spec = {**spec, "order": tuple(hit["order"]), "seasonal_order": tuple(hit["seasonal_order"])}
+    return spec
+
+def _sarimax(series, spec=None, exog=None):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX  # deferred: ~2s to import
+    spec = spec or _spec()
+    return SARIMAX(series, exog=exog, order=spec["order"], seasonal_order=spec["seasonal_order"],
+                   enforce_stationarity=False, enforce_invertibility=False)
+
+def _fit(series, spec=None, exog=None):
+    with span("sarimax.fit", nobs=len(series)):
+        return _sarimax(series, spec, exog).fit(disp=False)
 
+def _lineage(origin, spec, window):
+    return lineage_key(origin, {**spec, "window": window})
+
+def _incremental_fit(s, cache, spec, origin, window):
+    """Filter ``s`` with the parameters stored for an earlier version of the same series when its
+    untrimmed ``origin`` only appends days to the earlier one (the previous last day may have
+    been revised); ``s`` itself may have lost days at the start to a ``window``-day lookback.
+    Returns (results, last date at the last estimation), or None when a full fit is due: no
+    usable history, ``REFIT_EVERY`` days since the last estimation, or one-step errors on the
+    new days beyond ``DRIFT_THRESHOLD``."""
+    lin = cache.get(_lineage(origin, spec, window))
+    if lin is None:
+        return None
+    meta = lin["meta"]; prev = meta.get("origin_nobs")
+    if prev is None or len(origin) < prev or series_key(origin.iloc[:prev-1], spec) != meta["prefix"]:
+        return None
+    if int((s.index > pd.Timestamp(meta["fitted_last"])).sum()) >= REFIT_EVERY:
+        return None
+    res = _sarimax(s, spec).filter(lin["params"], cov_type="none")
+    z = res.filter_results.standardized_forecasts_error[0, s.index >= pd.Timestamp(meta["last"])]
+    z = z[np.isfinite(z)]
+    if z.size and float(np.mean(z**2)) > DRIFT_THRESHOLD:
+        return None
+    return res, meta["fitted_last"]
+
+def _forecast_moments(s, steps, cache=FIT_CACHE, incremental=True, spec=None, origin=None, window=None):
+    """Predictive mean/variance arrays for ``steps`` days ahead, served from ``cache`` when the
+    same series and spec were fitted before. A cached parameter vector that only lacks the
+    requested horizon is re-filtered instead of re-estimated, and with ``incremental`` a series
+    that extends a cached one is filtered with its stored parameters (see _incremental_fit).
+    ``origin`` is the untrimmed daily series ``s`` was cut from by a ``window``-day lookback
+    (default ``s`` itself); appends are recognised on it."""
+    spec = spec or _spec()
+    origin = s if origin is None else origin
+    with span("forecast_moments", nobs=len(s), steps=steps, freq=spec["freq"]) as sp:
+        key = series_key(s, spec) if cache is not None else None
+        hit = cache.get(key) if cache is not None else None
+        if hit is not None and len(hit["mean"]) >= steps:
+            sp.set(cache="hit")
+            return hit["mean"][:steps], hit["var"][:steps]
+        t0 = time.perf_counter()
+        if hit is not None:
+            sp.set(cache="refilter")
+            res = _sarimax(s, spec).filter(hit["params"], cov_type="none")
+            fitted_last = hit["meta"].get("fitted_last", str(s.index[-1]))
+        else:
+            inc = _incremental_fit(s, cache, spec, origin, window) if cache is not None and incremental else None
+            sp.set(cache="incremental" if inc is not None else "fit")
+            res, fitted_last = inc if inc is not None else (_fit(s, spec), str(s.index[-1]))
+        f = res.get_forecast(steps=steps)
+        mean = np.asarray(f.predicted_mean, dtype=float); var = np.asarray(f.var_pred_mean, dtype=float)
+        if cache is not None:
+            params = np.asarray(res.params, dtype=float)
+            meta = {**spec, "nobs": len(s), "last": str(s.index[-1]), "fitted_last": fitted_last,
+                    "fit_seconds": time.perf_counter() - t0}
+            cache.put(key, meta=meta, params=params, mean=mean, var=var)
+            cache.put(_lineage(origin, spec, window), params=params,
+                      meta={**meta, "origin_nobs": len(origin), "prefix": series_key(origin.iloc[:-1], spec)})
+    return mean, var
+
+def _apply_lookback(s, policy):
+    if policy.max_lookback_days is None:
+        return s
+    return s[s.index >= s.index.max() - pd.Timedelta(days=policy.max_lookback_days)]
+
+def _resample(s, freq):
+    """Daily-filled ``s`` at ``freq``: "B" drops weekends, "W" keeps every 7th day ending on the
+    last observation (the week's closing price)."""
+    if freq == "B":
+        return s[s.index.dayofweek < 5].asfreq("B").ffill()
+    if freq == "W":
+        return s.iloc[(len(s)-1) % 7::7].asfreq("7D")
+    return s
+
+def _daily_moments(s, max_h, freq="D", cache=FIT_CACHE, incremental=True, specs=SPECS, origin=None, window=None):
+    """Mean/variance for the ``max_h`` calendar days after ``s`` from a fit at ``freq``. Non-daily
+    forecasts are interpolated in time between the last observation (variance 0) and the
+    forecast points, and held flat past the last one. ``origin``/``window`` as in _forecast_moments."""
+    r = _resample(s, freq)
+    lineage = {"origin": origin, "window": window}
+    if freq == "D" or len(r) < 20:
+        return _forecast_moments(s, max_h, cache=cache, incremental=incremental, spec=_tuned_spec(s, "D", specs),
+                                 **lineage)
     idx_all = pd.date_range(s.index.max() + pd.Timedelta(days=1), periods=max_h, freq="D")
-    mean.index = idx_all; ci95.index = idx_all; ci80.index = idx_all
+    step = pd.tseries.frequencies.to_offset(r.index.freq)
+    fidx = pd.date_range(r.index[-1], idx_all[-1] + step, freq=step)[1:]
+    mean, var = _forecast_moments(r, len(fidx), cache=cache, incremental=incremental, spec=_tuned_spec(r, freq, specs),
+                                  **lineage)
+    keep = fidx > s.index.max()
+    anchor = pd.DatetimeIndex([s.index.max()])
+    pts = pd.DataFrame({"mean": np.r_[s.iloc[-1], mean[keep]], "var": np.r_[0.0, var[keep]]},
+                       index=anchor.append(fidx[keep]))
+    daily = pts.reindex(pts.index.union(idx_all)).interpolate(method="time").ffill().reindex(idx_all)
+    return daily["mean"].to_numpy(), daily["var"].to_numpy()
 
+def _short_forecasts(s, horizons):
+    """Forecast frames for series too short to fit (flat at the last value), else None."""
+    if s.empty:
+        return {h: pd.DataFrame(columns=["date","mean","lower80","upper80","lower95","upper95"]) for h in horizons}
+    if len(s) >= 20:
+        return None
+    out = {}
+    last = float(s.iloc[-1])
     for h in horizons:
-        idx = idx_all[:h]
-        out[h] = pd.DataFrame({
-            "date": idx,
-            "mean": mean.loc[idx].values,
-            "lower80": ci80.loc[idx].iloc[:,0].values,
-            "upper80": ci80.loc[idx].iloc[:,1].values,
-            "lower95": ci95.loc[idx].iloc[:,0].values,
-            "upper95": ci95.loc[idx].iloc[:,1].values,
-        })
+        idx = pd.date_range(s.index.max(), periods=h, freq="D")
+        base = pd.DataFrame({"date": idx})
+        base["mean"] = last
+        base["lower80"] = last; base["upper80"] = last
+        base["lower95"] = last; base["upper95"] = last
+        out[h] = base
     return out
+
+def _ci_frames(last_date, mean, var, horizons):
+    """Per-horizon frames from mean/variance arrays covering the days after ``last_date``."""
+    return _distribution(last_date, mean, var).frames(horizons)
+
+def _distribution(last_date, mean, var):
+    idx = pd.date_range(last_date + pd.Timedelta(days=1), periods=len(mean), freq="D")
+    return ForecastDistribution(idx, mean, var)
+
+@traced("multi_forecast_ci")
+def multi_forecast_ci(date_price_df: pd.DataFrame, horizons=HORIZONS, cache=FIT_CACHE, incremental=True,
+                      policy=DEFAULT_POLICY, model="sarimax", specs=SPECS):
+    """Returns dict[h] -> DataFrame(date, mean, lower80, upper80, lower95, upper95)
+
+    Fits are memoised in ``cache`` (a FitCache, or None to always refit). With ``incremental``,
+    a dataset that only gained new days since its last fit is Kalman-filtered with the stored
+    parameters; they are re-estimated every ``REFIT_EVERY`` days or on drift. ``policy`` (a
+    WindowPolicy) sets the training window and fit frequency. ``model`` is "sarimax" or a
+    name in fast_models.MODELS. SARIMAX orders come from ``specs`` (a SpecStore filled by
+    order_search.py) when the series has a tuned entry, else ORDER/SEASONAL_ORDER."""
+    if model != "sarimax":
+        return multi_forecast_many({0: date_price_df}, horizons=horizons, policy=policy, model=model)[0]
+    full = _prepare_series(date_price_df)
+    s = _apply_lookback(full, policy)
+    short = _short_forecasts(s, horizons)
+    if short is not None:
+        return short
+
+    out = {}
+    weekly = [h for h in horizons if policy.weekly_from is not None and h >= policy.weekly_from]
+    daily = [h for h in horizons if h not in weekly]
+    for freq, hs in ((policy.freq, daily), ("W", weekly)):
+        if not hs:
+            continue
+        mean, var = _daily_moments(s, max(hs), freq=freq, cache=cache, incremental=incremental, specs=specs,
+                                   origin=full, window=policy.max_lookback_days)
+        out.update(_ci_frames(s.index.max(), mean, var, hs))
+    return {h: out[h] for h in horizons}
+
+@traced("multi_forecast_many")
+def multi_forecast_many(frames, horizons=HORIZONS, model="sarimax", policy=DEFAULT_POLICY, **kwargs):
+    """Forecast several datasets: dict name -> price frame (or Series) in, dict name ->
+    multi_forecast_ci-style dict out. Fast models (fast_models.MODELS) fit every series in
+    one batched pass over a (series x time) matrix of the daily-filled prices, using the
+    policy's lookback only; "sarimax" fits each series in turn with ``kwargs``."""
+    if model == "sarimax":
+        return {k: multi_forecast_ci(df, horizons=horizons, policy=policy, **kwargs) for k, df in frames.items()}
+    fn = FAST_MODELS[model]
+    out, batch = {}, {}
+    for k, df in frames.items():
+        s = _apply_lookback(_prepare_series(df), policy)
+        short = _short_forecasts(s, horizons)
+        if short is not None:
+            out[k] = short
+        else:
+            batch[k] = s
+    if batch:
+        Y = stack_tail([s.to_numpy() for s in batch.values()])
+        mean, var = fn(Y, max(horizons), SEASONAL_PERIODS["D"])
+        for i, (k, s) in enumerate(batch.items()):
+            out[k] = _ci_frames(s.index.max(), mean[i], var[i], horizons)
+    return {k: out[k] for k in frames}
+
+def forecast_distribution(date_price_df, horizon=max(HORIZONS), cache=FIT_CACHE, incremental=True,
+                          policy=DEFAULT_POLICY, model="sarimax", specs=SPECS):
+    """ForecastDistribution for the ``horizon`` days after the last price, fitted as in
+    multi_forecast_ci (a horizon >= ``policy.weekly_from`` uses the weekly model). Returns
+    None when the series is too short to fit."""
+    full = _prepare_series(date_price_df)
+    s = _apply_lookback(full, policy)
+    if len(s) < 20:
+        return None
+    if model != "sarimax":
+        mean, var = FAST_MODELS[model](stack_tail([s.to_numpy()]), horizon, SEASONAL_PERIODS["D"])
+        return _distribution(s.index.max(), mean[0], var[0])
+    weekly = policy.weekly_from is not None and horizon >= policy.weekly_from
+    mean, var = _daily_moments(s, horizon, freq="W" if weekly else policy.freq, cache=cache, incremental=incremental,
+                               specs=specs, origin=full, window=policy.max_lookback_days)
+    return _distribution(s.index.max(), mean, var)
+
+def resolve_spec(date_price_df, policy=DEFAULT_POLICY, specs=SPECS):
+    """The SARIMAX spec multi_forecast_ci fits to ``date_price_df``'s policy.freq series."""
+    s = _apply_lookback(_prepare_series(date_price_df), policy)
+    return _tuned_spec(_resample(s, policy.freq), policy.freq, specs)
@@ -1,6 +1,7 @@
-
-import pandas as pd
-from statsmodels.tsa.statespace.sarimax import SARIMAX
+import numpy as np, pandas as pd
+from scipy.special import ndtri
+from model import HORIZONS, ORDER, SEASONAL_ORDER, _sarimax
+from tracing import span, traced
 
 def _align_exog(price_df, exog_df):
     df = price_df.copy()
@@ -12,26 +13,51 @@ def _align_exog(price_df, exog_df):
     X["Date"] = pd.to_datetime(X["Date"])
     X = X.sort_values("Date").set_index("Date")
     X = X.select_dtypes(include="number").asfreq("D").ffill().reindex(y.index).ffill()
-    return y, X
-
-def forecast_with_exog(price_df, exog_past, exog_future, horizon_days):
-    y, X = _align_exog(price_df, exog_past)
-    if y.empty or X.empty:
-        return pd.DataFrame(columns=["date","mean","lower95","upper95"])
-    m = SARIMAX(y, exog=X, order=(1,1,1), seasonal_order=(0,1,1,7),
-                enforce_stationarity=False, enforce_invertibility=False).fit(disp=False)
+    # SARIMAX rejects missing exog, so train only where every feature is known
+    keep = X.notna().all(axis=1).to_numpy()
+    return y[keep], X[keep]
 
+def _future_exog(exog_future, X, y, steps):
+    """Future exog rows for the ``steps`` days after ``y`` ends; gaps take the nearest known row."""
+    idx = pd.date_range(y.index.max() + pd.Timedelta(days=1), periods=steps, freq="D")
     F = exog_future.copy()
     F["Date"] = pd.to_datetime(F["Date"])
     F = F.sort_values("Date").set_index("Date")
-    F = F.select_dtypes(include="number").asfreq("D").ffill()
-    if len(F) < horizon_days:
-        add = pd.date_range(start=F.index.max() if len(F) else pd.Timestamp.today(), periods=horizon_days, freq="D")
-        F = F.reindex(add, method="ffill")
-    F = F.iloc[:horizon_days]
+    F = F.select_dtypes(include="number").reindex(columns=X.columns)
+    F = pd.concat([X.iloc[[-1]], F[F.index > X.index[-1]]]).asfreq("D").ffill()
+    return F.reindex(idx).ffill().fillna(X.iloc[-1])
+
+@traced("multi_forecast_with_exog")
+def multi_forecast_with_exog(price_df, exog_past, exog_future, horizons=HORIZONS):
+    """Returns dict[h] -> DataFrame(date, mean, lower80, upper80, lower95, upper95).
 
-    f = m.get_forecast(steps=horizon_days, exog=F)
-    mean = f.predicted_mean; ci = f.conf_int(alpha=0.05)
-    idx = pd.date_range(y.index.max() + pd.Timedelta(days=1), periods=horizon_days, freq="D")
-    mean.index = idx; ci.index = idx
-    return pd.DataFrame({"date": idx, "mean": mean.values, "lower95": ci.iloc[:,0].values, "upper95": ci.iloc[:,1].values})
+    Aligns and fits once, forecasts to max(horizons) once and slices per horizon."""
+    with span("exog.align") as sp:
+        y, X = _align_exog(price_df, exog_past)
+        sp.set(nobs=len(y), features=X.shape[1])
+    if y.empty or X.empty or X.shape[1] == 0:
+        return {h: pd.DataFrame(columns=["date","mean","lower80","upper80","lower95","upper95"]) for h in horizons}
+    with span("sarimax.fit", nobs=len(y), exog=True):
+        m = _sarimax(y, {"order": ORDER, "seasonal_order": SEASONAL_ORDER}, exog=X).fit(disp=False)
+
+    max_h = max(horizons)
+    with span("exog.forecast", steps=max_h):
+        f = m.get_forecast(steps=max_h, exog=_future_exog(exog_future, X, y, max_h))
+    mean = np.asarray(f.predicted_mean, dtype=float); sd = np.sqrt(np.asarray(f.var_pred_mean, dtype=float))
+    z80, z95 = ndtri(0.90), ndtri(0.975)
+    idx_all = pd.date_range(y.index.max() + pd.Timedelta(days=1), periods=max_h, freq="D")
+    out = {}
+    for h in horizons:
+        out[h] = pd.DataFrame({
+            "date": idx_all[:h],
+            "mean": mean[:h],
+            "lower80": mean[:h] - z80*sd[:h],
+            "upper80": mean[:h] + z80*sd[:h],
+            "lower95": mean[:h] - z95*sd[:h],
+            "upper95": mean[:h] + z95*sd[:h],
+        })
+    return out
+
+def forecast_with_exog(price_df, exog_past, exog_future, horizon_days):
+    out = multi_forecast_with_exog(price_df, exog_past, exog_future, horizons=[horizon_days])[horizon_days]
+    return out[["date","mean","lower95","upper95"]]
@@ -21,8 +21,11 @@ def news_tab():
     st.divider()
     st.subheader("Build News + Weather Features")
     if st.button("Build features (no keys)"):
-        past, future = assemble_exog(days_back=120, days_forward=16)
-        st.success("Built features.")
+        past, future, failed = assemble_exog(days_back=120, days_forward=16)
+        if failed:
+            st.warning("Built partial features; failed sources: " + "; ".join(f"{k} ({v})" for k, v in failed.items()))
+        else:
+            st.success("Built features.")
         st.dataframe(past.tail(), use_container_width=True)
         st.download_button("Download past features CSV", data=past.to_csv(index=False).encode("utf-8"), file_name="exog_past.csv")
         st.download_button("Download future features CSV", data=future.to_csv(index=False).encode("utf-8"), file_name="exog_future.csv")
@@ -1,10 +1,29 @@
 
-import datetime as dt
+import asyncio, contextlib, contextvars, datetime as dt, functools, hashlib, os, re, tempfile, time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
-import pandas as pd, requests, feedparser
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+import pandas as pd, requests
+from requests.adapters import HTTPAdapter
+import tracing
+from price_store import file_lock
+from tracing import span, traced
 
-ANALYZER = SentimentIntensityAnalyzer()
+NEWS_CACHE_DIR = ".cache/news"
+WEATHER_CACHE_DIR = ".cache/weather"
+FORECAST_TTL = 3 * 3600   # seconds a cached 16-day forecast is served before refetching
+WEATHER_WORKERS = 8
+
+# one pooled session so concurrent Open-Meteo calls reuse connections
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=WEATHER_WORKERS))
+
+# assemble_exog: seconds each request may take, parallel requests, retries after a failure
+# and the first backoff delay (doubled on every retry)
+SOURCE_TIMEOUTS = {"news": 20, "archive": 30, "forecast": 20}
+MAX_CONCURRENCY = 8
+RETRIES = 2
+BACKOFF = 0.5
 
 def _dates_to_date_series(obj):
     """
@@ -27,10 +46,23 @@ def _dates_to_date_series(obj):
 
 # ---- NEWS ----
 
-def fetch_rice_news(days=7, max_items=40, query="rice price OR basmati price OR rough rice OR FAO rice"):
+def fetch_rice_news(days=7, max_items=40, query="rice price OR basmati price OR rough rice OR FAO rice", timeout=60):
+    """Recent headlines for ``query``; an unreachable feed gives an empty list."""
+    try:
+        return _fetch_rice_news(days=days, max_items=max_items, query=query, timeout=timeout)
+    except requests.RequestException:
+        return []
+
+def _fetch_rice_news(days=7, max_items=40, query="rice price OR basmati price OR rough rice OR FAO rice", timeout=60):
+    """fetch_rice_news that raises when the feed cannot be fetched."""
     q = requests.utils.quote(f'{query} when:{days}d')
     url = f"https://news.google.com/rss/search?q={q}&hl=en-IN&gl=IN&ceid=IN:en"
-    feed = feedparser.parse(url)
+    with span("news.rss", days=days) as sp:
+        # fetched through the session (not feedparser's urllib) so the timeout applies
+        r = SESSION.get(url, timeout=timeout); r.raise_for_status()
+        import feedparser
+        feed = feedparser.parse(r.content)
+        sp.set(entries=len(feed.entries))
     items = []
     for e in feed.entries[:max_items]:
         pub = None
@@ -49,23 +81,122 @@ def fetch_rice_news(days=7, max_items=40, query="rice price OR basmati price OR
         })
     return items
 
-def build_news_sentiment(days_back=120, query="rice price OR basmati price OR rough rice OR FAO rice"):
-    items = fetch_rice_news(days=min(days_back, 30), max_items=100, query=query)
+HEADLINE_COLS = ["id","Date","sent","title","link","published","source"]
+
+def headline_id(item):
+    """Stable key for a headline: its link, or its title when the link is missing."""
+    key = item.get("link") or item.get("title") or ""
+    return hashlib.sha1(str(key).encode("utf-8")).hexdigest()
+
+@functools.lru_cache(maxsize=1)
+def analyzer():
+    """The VADER analyzer, built on first use (it loads its lexicon from disk)."""
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+def score_headlines(texts):
+    """VADER compound score for each text in one pass over the batch."""
+    polarity = analyzer().polarity_scores
+    return [polarity(t)["compound"] for t in texts]
+
+def _news_paths(query):
+    tag = hashlib.sha1(query.encode("utf-8")).hexdigest()[:12]
+    return (os.path.join(NEWS_CACHE_DIR, f"{tag}_headlines.csv"),
+            os.path.join(NEWS_CACHE_DIR, f"{tag}_daily.csv"),
+            os.path.join(NEWS_CACHE_DIR, f"{tag}.lock"))
+
+def _write_csv(d, path):
+    """Write ``d`` to ``path`` through a temporary file so readers never see a partial table."""
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fh:
+            d.to_csv(fh, index=False)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def _daily_from_headlines(hpath):
+    """Per-day (sum, count) sentiment rebuilt from the headline store, or None if unreadable."""
+    try:
+        h = pd.read_csv(hpath, usecols=["Date","sent"])
+    except (OSError, ValueError, pd.errors.EmptyDataError):
+        return None
+    h["Date"] = pd.to_datetime(h["Date"], errors="coerce").dt.date
+    h = h.dropna(subset=["Date","sent"])
+    return h.groupby("Date")["sent"].agg(sent_sum="sum", n="count").reset_index()
+
+def _read_daily(path, hpath=None):
+    """The stored per-day table; when it is missing or unreadable it is rebuilt from the
+    headline store ``hpath`` so a damaged file never truncates the accumulated history."""
+    try:
+        d = pd.read_csv(path)
+        d["Date"] = pd.to_datetime(d["Date"], errors="coerce").dt.date
+        return d.dropna(subset=["Date"])
+    except (OSError, KeyError, pd.errors.EmptyDataError, pd.errors.ParserError):
+        pass
+    d = _daily_from_headlines(hpath) if hpath else None
+    return d if d is not None else pd.DataFrame(columns=["Date","sent_sum","n"])
+
+def update_headline_store(items, query="rice price OR basmati price OR rough rice OR FAO rice"):
+    """Append headlines not seen before to the query's store, scoring each exactly once, and fold
+    them into the stored per-day (sum, count) sentiment. Returns that daily table. The whole
+    read-modify-write holds the query's lock file, so concurrent callers (app sessions, the
+    server, materialize) neither score a headline twice nor lose each other's counts."""
+    hpath, dpath, lock = _news_paths(query)
+    try:
+        os.makedirs(NEWS_CACHE_DIR, exist_ok=True)
+        guard = file_lock(lock) if os.access(NEWS_CACHE_DIR, os.W_OK) else contextlib.nullcontext()
+    except OSError:
+        guard = contextlib.nullcontext()   # read-only cache directory: nothing is written either
+    with guard:
+        return _update_headline_store(items, hpath, dpath)
+
+def _update_headline_store(items, hpath, dpath):
+    daily = _read_daily(dpath, hpath)
     if not items:
+        return daily
+    try:
+        seen = set(pd.read_csv(hpath, usecols=["id"])["id"])
+    except (OSError, ValueError, pd.errors.EmptyDataError):
+        seen = set()
+    new = pd.DataFrame(items)
+    new["id"] = [headline_id(it) for it in items]
+    new = new[~new["id"].isin(seen)].drop_duplicates("id")
+    if new.empty:
+        return daily
+    text = new.get("title", pd.Series("", index=new.index)).fillna("").astype(str) + " " + \
+           new.get("summary", pd.Series("", index=new.index)).fillna("").astype(str)
+    with span("news.score", rows=len(new)):
+        new["sent"] = score_headlines(text.tolist())
+    new["Date"] = pd.to_datetime(new["published"], errors="coerce", utc=True).dt.date
+    inc = new.dropna(subset=["Date"]).groupby("Date")["sent"].agg(sent_sum="sum", n="count").reset_index()
+    daily = pd.concat([daily, inc], ignore_index=True).groupby("Date", as_index=False)[["sent_sum","n"]].sum()
+    try:
+        os.makedirs(NEWS_CACHE_DIR, exist_ok=True)
+        new.reindex(columns=HEADLINE_COLS).to_csv(hpath, mode="a", header=not os.path.exists(hpath), index=False)
+        _write_csv(daily, dpath)
+    except OSError:
+        pass
+    return daily
+
+@traced("news.sentiment")
+def build_news_sentiment(days_back=120, query="rice price OR basmati price OR rough rice OR FAO rice", timeout=60):
+    """Daily mean headline sentiment over the last ``days_back`` days. The feed only reaches 30
+    days back, so older days come from the persistent headline store built by earlier calls."""
+    items = _fetch_rice_news(days=min(days_back, 30), max_items=100, query=query, timeout=timeout)
+    daily = update_headline_store(items, query=query)
+    daily = daily[daily["Date"] >= date.today() - timedelta(days=days_back)]
+    if daily.empty:
         return pd.DataFrame(columns=["Date","news_sentiment"])
-    df = pd.DataFrame(items)
-    def comp(row):
-        text = f"{row.get('title','')} {row.get('summary','')}"
-        return ANALYZER.polarity_scores(text)["compound"]
-    df["sent"] = df.apply(comp, axis=1)
-    df["Date"] = pd.to_datetime(df["published"]).dt.date
-    df = df.dropna(subset=["Date"])
-    agg = df.groupby("Date")["sent"].mean().rename("news_sentiment").reset_index()
-    return agg
+    agg = pd.DataFrame({"Date": daily["Date"], "news_sentiment": daily["sent_sum"] / daily["n"]})
+    return agg.sort_values("Date").reset_index(drop=True)
 
 # ---- WEATHER ----
 
-def fetch_weather_daily(lat, lon, start_date, end_date):
+def fetch_weather_daily(lat, lon, start_date, end_date, timeout=60):
     """Open-Meteo ERA5 archive daily temp/precip with robust date handling."""
     url = "https://archive-api.open-meteo.com/v1/era5"
     params = {
@@ -74,7 +205,7 @@ def fetch_weather_daily(lat, lon, start_date, end_date):
         "daily": ["temperature_2m_mean","precipitation_sum"],
         "timezone": "auto"
     }
-    r = requests.get(url, params=params, timeout=60); r.raise_for_status()
+    r = SESSION.get(url, params=params, timeout=timeout); r.raise_for_status()
     j = r.json()
     if "daily" not in j or not j["daily"].get("time"):
         return pd.DataFrame(columns=["Date","temp","precip"])
@@ -87,7 +218,7 @@ def fetch_weather_daily(lat, lon, start_date, end_date):
     d = d.dropna(subset=["Date"])
     return d
 
-def fetch_weather_forecast(lat, lon, days_forward=16):
+def fetch_weather_forecast(lat, lon, days_forward=16, timeout=60):
     """Open-Meteo forecast up to 16 days with robust date handling."""
     url = "https://api.open-meteo.com/v1/forecast"
     params = {
@@ -96,7 +227,7 @@ def fetch_weather_forecast(lat, lon, days_forward=16):
         "forecast_days": days_forward,
         "timezone": "auto"
     }
-    r = requests.get(url, params=params, timeout=60); r.raise_for_status()
+    r = SESSION.get(url, params=params, timeout=timeout); r.raise_for_status()
     j = r.json()
     if "daily" not in j or not j["daily"].get("time"):
         return pd.DataFrame(columns=["Date","temp","precip"])
@@ -115,56 +246,160 @@ RICE_REGIONS = {
     "Can Tho, Vietnam": (10.0452, 105.7469),
 }
 
+def _weather_cache_file(name, lat, lon, kind):
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_").lower()
+    return os.path.join(WEATHER_CACHE_DIR, f"{slug}_{lat:.2f}_{lon:.2f}_{kind}.csv")
+
+def _read_weather_cache(path):
+    try:
+        d = pd.read_csv(path)
+    except (OSError, pd.errors.EmptyDataError):
+        return pd.DataFrame(columns=["Date","temp","precip"])
+    d["Date"] = pd.to_datetime(d["Date"], errors="coerce").dt.date
+    return d.dropna(subset=["Date"])
+
+def _write_weather_cache(path, d):
+    try:
+        _write_csv(d, path)
+    except OSError:
+        pass
+
+def cached_weather_daily(name, lat, lon, start, end, timeout=60):
+    """fetch_weather_daily backed by a per-region cache: archive days are immutable once
+    published, so only days missing from the cache (or still null in ERA5) are requested."""
+    path = _weather_cache_file(name, lat, lon, "archive")
+    have = _read_weather_cache(path)
+    want = pd.date_range(start, end, freq="D").date
+    known = set(have.dropna(subset=["temp","precip"], how="all")["Date"])
+    missing = [d for d in want if d not in known]
+    with span("weather.archive", region=name, cache_hit=not missing, missing=len(missing)):
+        if missing:
+            new = fetch_weather_daily(lat, lon, missing[0].strftime("%Y-%m-%d"), missing[-1].strftime("%Y-%m-%d"),
+                                      timeout=timeout)
+            if not new.empty:
+                have = pd.concat([have, new], ignore_index=True).drop_duplicates("Date", keep="last").sort_values("Date")
+                _write_weather_cache(path, have)
+    return have[have["Date"].isin(set(want))].reset_index(drop=True)
+
+def cached_weather_forecast(name, lat, lon, days_forward=16, timeout=60):
+    """fetch_weather_forecast served from a per-region cache for ``FORECAST_TTL`` seconds."""
+    path = _weather_cache_file(name, lat, lon, "forecast")
+    try:
+        fresh = time.time() - os.path.getmtime(path) < FORECAST_TTL
+    except OSError:
+        fresh = False
+    with span("weather.forecast", region=name, cache_hit=False) as sp:
+        if fresh:
+            d = _read_weather_cache(path)
+            d = d[d["Date"] >= date.today()]
+            if len(d) >= days_forward:
+                sp.set(cache_hit=True)
+                return d.iloc[:days_forward].reset_index(drop=True)
+        d = fetch_weather_forecast(lat, lon, days_forward=days_forward, timeout=timeout)
+        if not d.empty:
+            _write_weather_cache(path, d)
+        return d
+
+def _region_average(frames):
+    """Outer-join per-region frames on Date and average their temp_/precip_ columns."""
+    if not frames:
+        return pd.DataFrame(columns=["Date","temp_avg","precip_avg"])
+    out = frames[0]
+    for f in frames[1:]:
+        out = pd.merge(out, f, on="Date", how="outer")
+    out = out.sort_values("Date")
+    temp_cols = [c for c in out.columns if c.startswith("temp_")]
+    pr_cols = [c for c in out.columns if c.startswith("precip_")]
+    out["temp_avg"] = out[temp_cols].apply(pd.to_numeric, errors="coerce").mean(axis=1)
+    out["precip_avg"] = out[pr_cols].apply(pd.to_numeric, errors="coerce").mean(axis=1)
+    return out
+
+def _by_region(name, d):
+    return d.rename(columns={"temp": f"temp_{name}", "precip": f"precip_{name}"})
+
+@traced("weather.features")
 def build_weather_features(days_back=120, days_forward=16, regions=RICE_REGIONS):
     today = date.today()
     start = today - timedelta(days=days_back)
     past_frames = []
     future_frames = []
+    with ThreadPoolExecutor(max_workers=max(1, min(WEATHER_WORKERS, 2*len(regions)))) as pool:
+        jobs = [(name,
+                 tracing.submit(pool, cached_weather_daily, name, lat, lon, start, today),
+                 tracing.submit(pool, cached_weather_forecast, name, lat, lon, days_forward))
+                for name, (lat, lon) in regions.items()]
+        for name, past_job, fut_job in jobs:
+            p = past_job.result()
+            if not p.empty:
+                past_frames.append(_by_region(name, p))
+            fut = fut_job.result()
+            if not fut.empty:
+                future_frames.append(_by_region(name, fut))
+    return _region_average(past_frames), _region_average(future_frames)
+
+# ---- CONCURRENT INGESTION ----
+
+# ``failed`` maps each source that gave up (e.g. "news", "archive:Bangkok, Thailand") to its error
+ExogFeatures = namedtuple("ExogFeatures", ["past", "future", "failed"])
+
+async def _call(source, sem, pool, fn, *args, timeout, retries=RETRIES, backoff=BACKOFF):
+    """Run blocking ``fn(*args, timeout=timeout)`` on ``pool`` under ``sem``, retrying with
+    exponential backoff when it raises. ``timeout`` is the HTTP timeout that bounds each
+    attempt; an attempt is never abandoned while running, so retries of one source never
+    overlap on its cache files."""
+    loop = asyncio.get_running_loop()
+    with span("exog.source", source=source) as sp:
+        for attempt in range(retries + 1):
+            try:
+                async with sem:
+                    call = functools.partial(contextvars.copy_context().run, fn, *args, timeout=timeout)
+                    return await loop.run_in_executor(pool, call)
+            except Exception as e:
+                if attempt == retries:
+                    sp.set(failed=type(e).__name__)
+                    raise
+                sp.incr("retries")
+            await asyncio.sleep(backoff * 2**attempt)
+
+async def gather_exog(days_back=120, days_forward=16, regions=RICE_REGIONS, timeouts=None):
+    """Fetch news sentiment and every region's archive and forecast weather concurrently.
+    A source that still fails after its retries is left out and reported in ``failed``."""
+    timeouts = {**SOURCE_TIMEOUTS, **(timeouts or {})}
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+    today = date.today()
+    start = today - timedelta(days=days_back)
+    calls = {"news": _call("news", sem, pool, build_news_sentiment, days_back, timeout=timeouts["news"])}
     for name, (lat, lon) in regions.items():
-        p = fetch_weather_daily(lat, lon, start.strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d"))
-        if not p.empty:
-            p = p.rename(columns={"temp": f"temp_{name}", "precip": f"precip_{name}"})
-            past_frames.append(p)
-        fut = fetch_weather_forecast(lat, lon, days_forward=days_forward)
-        if not fut.empty:
-            fut = fut.rename(columns={"temp": f"temp_{name}", "precip": f"precip_{name}"})
-            future_frames.append(fut)
-
-    if past_frames:
-        past = past_frames[0]
-        for f in past_frames[1:]:
-            past = pd.merge(past, f, on="Date", how="outer")
-        past = past.sort_values("Date")
-        temp_cols = [c for c in past.columns if c.startswith("temp_")]
-        pr_cols = [c for c in past.columns if c.startswith("precip_")]
-        past["temp_avg"] = pd.to_numeric(past[temp_cols], errors="coerce").mean(axis=1)
-        past["precip_avg"] = pd.to_numeric(past[pr_cols], errors="coerce").mean(axis=1)
-    else:
-        past = pd.DataFrame(columns=["Date","temp_avg","precip_avg"])
-
-    if future_frames:
-        fut = future_frames[0]
-        for f in future_frames[1:]:
-            fut = pd.merge(fut, f, on="Date", how="outer")
-        fut = fut.sort_values("Date")
-        temp_cols = [c for c in fut.columns if c.startswith("temp_")]
-        pr_cols = [c for c in fut.columns if c.startswith("precip_")]
-        fut["temp_avg"] = pd.to_numeric(fut[temp_cols], errors="coerce").mean(axis=1)
-        fut["precip_avg"] = pd.to_numeric(fut[pr_cols], errors="coerce").mean(axis=1)
-    else:
-        fut = pd.DataFrame(columns=["Date","temp_avg","precip_avg"])
-
-    return past, fut
-
-def assemble_exog(days_back=120, days_forward=16):
-    news = build_news_sentiment(days_back=min(days_back, 30))
-    w_past, w_future = build_weather_features(days_back=days_back, days_forward=days_forward)
+        calls[f"archive:{name}"] = _call(f"archive:{name}", sem, pool, cached_weather_daily, name, lat, lon, start,
+                                         today, timeout=timeouts["archive"])
+        calls[f"forecast:{name}"] = _call(f"forecast:{name}", sem, pool, cached_weather_forecast, name, lat, lon,
+                                          days_forward, timeout=timeouts["forecast"])
+    with pool:
+        results = dict(zip(calls, await asyncio.gather(*calls.values(), return_exceptions=True)))
+    failed = {k: f"{type(v).__name__}: {v}" for k, v in results.items() if isinstance(v, BaseException)}
+    ok = {k: v for k, v in results.items() if k not in failed}
+    w_past = _region_average([_by_region(k.split(":", 1)[1], d) for k, d in ok.items()
+                              if k.startswith("archive:") and not d.empty])
+    w_future = _region_average([_by_region(k.split(":", 1)[1], d) for k, d in ok.items()
+                                if k.startswith("forecast:") and not d.empty])
+    news = ok.get("news", pd.DataFrame(columns=["Date"]))
+    return ExogFeatures(*_combine(w_past, w_future, news), failed)
+
+def _combine(w_past, w_future, news):
     past = pd.merge(w_past, news, on="Date", how="outer").sort_values("Date")
     for col in [c for c in past.columns if c != "Date"]:
         past[col] = pd.to_numeric(past[col], errors="coerce")
-    past = past.fillna(method="ffill").fillna(method="bfill")
+    # features whose source failed entirely are dropped rather than left all-NaN
+    past = past.ffill().bfill()
+    past = past.loc[:, past.notna().any() | (past.columns == "Date")]
     future = w_future.copy()
     future["news_sentiment"] = 0.0
     cols = ["Date"] + [c for c in past.columns if c != "Date"]
-    past = past[cols]; future = future[cols]
-    return past, future
+    return past[cols], future.reindex(columns=cols)
+
+@traced("assemble_exog")
+def assemble_exog(days_back=120, days_forward=16, timeouts=None):
+    """(past, future, failed) exogenous features; see gather_exog. Wall time is about that of
+    the slowest request rather than their sum."""
+    return asyncio.run(gather_exog(days_back=days_back, days_forward=days_forward, timeouts=timeouts))
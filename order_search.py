@@ -0,0 +1,122 @@
+"""Per-series SARIMAX order search, persisted for multi_forecast_ci.
+
+    python order_search.py data/*.csv data/stocks/*.csv --workers 4
+
+Every candidate in CANDIDATES is first fitted on the last ``PRUNE_WINDOW`` observations
+with a capped optimizer; only the ``KEEP`` best by information criterion (plus the default
+spec) are refitted on the full series, and the best of those is stored in model.SPECS.
+Fits of all series and candidates share one process pool. A series is searched again
+once its entry is ``RESEARCH_DAYS`` old.
+"""
+import argparse, datetime as dt, itertools, sys, time, warnings
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from batch import DEFAULT_WORKERS, dataset_name
+from fit_cache import spec_key
+from model import (DEFAULT_POLICY, SEASONAL_ORDER, SEASONAL_PERIODS, SPECS, _apply_lookback,
+                   _prepare_series, _resample, _sarimax, _spec)
+
+ORDERS = [(p, 1, q) for p, q in itertools.product(range(3), range(3))]
+SEASONAL = [(0, 0, 0), (1, 0, 0), (0, 0, 1), (0, 1, 1)]
+CANDIDATES = [(o, s) for o in ORDERS for s in SEASONAL]
+PRUNE_WINDOW = 730    # observations the pruning round is fitted on
+PRUNE_MAXITER = 30
+FULL_MAXITER = 50     # statsmodels' default
+KEEP = 4              # candidates refitted on the full series
+RESEARCH_DAYS = 30
+
+def _ic(res):
+    """AIC with the log-likelihood rescaled to all observations, so candidates whose
+    differencing burns a different number of initial observations stay comparable."""
+    n = res.nobs
+    return float(-2 * res.llf * n / max(n - res.loglikelihood_burn, 1) + 2 * len(res.params))
+
+def _candidate_spec(order, seasonal, freq):
+    m = SEASONAL_PERIODS.get(freq, SEASONAL_ORDER[3])
+    return {**_spec(freq), "order": tuple(order), "seasonal_order": tuple(seasonal) + ((m,) if any(seasonal) else (0,))}
+
+def _score(series, spec, maxiter):
+    """Pool worker: information criterion of ``spec`` on ``series`` (inf when the fit fails)."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            res = _sarimax(series, spec).fit(disp=False, maxiter=maxiter)
+        except Exception:
+            return float("inf")
+    ic = _ic(res)
+    return ic if ic == ic else float("inf")
+
+def _same(a, b):
+    return tuple(a["order"]) == tuple(b["order"]) and tuple(a["seasonal_order"]) == tuple(b["seasonal_order"])
+
+def search_many(series, freq="D", workers=DEFAULT_WORKERS, pool=None):
+    """Search every series in ``series`` (name -> prepared pd.Series). Returns name -> entry
+    with the chosen "order"/"seasonal_order", its "ic", the default spec's "default_ic",
+    and how many candidates were evaluated and refitted."""
+    series = {k: s for k, s in series.items() if len(s) >= 2 * max(SEASONAL_PERIODS.values()) + 20}
+    own = pool is None
+    pool = pool or ProcessPoolExecutor(max_workers=max(1, workers))
+    try:
+        specs = [_candidate_spec(o, s, freq) for o, s in CANDIDATES]
+        prune = {(k, i): pool.submit(_score, s.iloc[-PRUNE_WINDOW:], spec, PRUNE_MAXITER)
+                 for k, s in series.items() for i, spec in enumerate(specs)}
+        finals = {}
+        for k, s in series.items():
+            ranked = sorted(range(len(specs)), key=lambda i: prune[(k, i)].result())
+            keep = [specs[i] for i in ranked[:KEEP] if prune[(k, i)].result() < float("inf")]
+            if not any(_same(sp, _spec(freq)) for sp in keep):
+                keep.append(_spec(freq))
+            finals[k] = [(sp, pool.submit(_score, s, sp, FULL_MAXITER)) for sp in keep]
+        out = {}
+        today = dt.date.today().isoformat()
+        for k, fits in finals.items():
+            scored = [(f.result(), sp) for sp, f in fits]
+            default_ic = next(ic for ic, sp in scored if _same(sp, _spec(freq)))
+            ic, best = min(scored, key=lambda t: t[0])
+            if ic == float("inf"):
+                best, ic = _spec(freq), default_ic
+            out[k] = {"order": list(best["order"]), "seasonal_order": list(best["seasonal_order"]), "freq": freq,
+                      "ic": ic, "default_ic": default_ic, "nobs": len(series[k]), "searched": today,
+                      "evaluated": len(specs), "refitted": len(fits)}
+        return out
+    finally:
+        if own:
+            pool.shutdown()
+
+def is_stale(entry, max_age_days=RESEARCH_DAYS):
+    if entry is None:
+        return True
+    age = dt.date.today() - dt.date.fromisoformat(entry.get("searched", "1970-01-01"))
+    return age.days >= max_age_days
+
+def tune_files(paths, policy=DEFAULT_POLICY, specs=SPECS, workers=DEFAULT_WORKERS, force=False,
+               max_age_days=RESEARCH_DAYS):
+    """Search the CSVs in ``paths`` whose stored spec is missing or stale (all with ``force``)
+    and store the results. Returns name -> entry for the series that were searched."""
+    todo, names = {}, {}
+    for path in paths:
+        s = _apply_lookback(_prepare_series(pd.read_csv(path)), policy)
+        r = _resample(s, policy.freq)
+        if len(r) and (force or is_stale(specs.get(spec_key(r, policy.freq)), max_age_days)):
+            todo[path], names[path] = r, dataset_name(path)
+    found = search_many(todo, freq=policy.freq, workers=workers)
+    specs.put_many({spec_key(todo[p], policy.freq): e for p, e in found.items()})
+    return {names[p]: e for p, e in found.items()}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Search and store SARIMAX orders per dataset.")
+    ap.add_argument("paths", nargs="+", help="CSV files with Date/Price columns")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    ap.add_argument("--force", action="store_true", help="search even when the stored spec is recent")
+    ap.add_argument("--max-age-days", type=int, default=RESEARCH_DAYS)
+    args = ap.parse_args(argv)
+    t0 = time.perf_counter()
+    found = tune_files(args.paths, workers=args.workers, force=args.force, max_age_days=args.max_age_days)
+    for name, e in sorted(found.items()):
+        print(f"{name:24s} order={tuple(e['order'])} seasonal={tuple(e['seasonal_order'])} "
+              f"ic={e['ic']:.1f} (default {e['default_ic']:.1f})")
+    print(f"searched {len(found)} of {len(args.paths)} datasets in {time.perf_counter() - t0:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
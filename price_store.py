@@ -0,0 +1,215 @@
+import contextlib, json, os, shutil, tempfile
+try:
+    import fcntl
+except ImportError:   # not POSIX: writers are not serialized
+    fcntl = None
+import numpy as np, pandas as pd
+
+STORE_DIR = "data/store"
+CURRENT = "CURRENT"   # pointer file naming the live generation directory
+
+def csv_symbol(path):
+    """Store symbol for a dataset CSV: its file name without extension (e.g. KRBL_NS)."""
+    return os.path.basename(path).rsplit(".", 1)[0]
+
+def source_stamp(path):
+    """[path, mtime_ns, size] recorded for an imported CSV, or None when it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [path, st.st_mtime_ns, st.st_size]
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive flock on ``path`` (created if missing) for the block."""
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(path, "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        yield
+
+def normalize_prices(df: pd.DataFrame) -> pd.DataFrame:
+    """Date/Price frame with parsed dates, numeric prices, one row per day, sorted."""
+    from model import DATE_CANDIDATES, PRICE_CANDIDATES, _find_col
+    if df is None or df.empty:
+        return pd.DataFrame({"Date": pd.Series(dtype="datetime64[ns]"), "Price": pd.Series(dtype=float)})
+    price_col = _find_col(df.columns, PRICE_CANDIDATES) or df.columns[-1]
+    date_col  = _find_col(df.columns, DATE_CANDIDATES)  or df.columns[0]
+    out = pd.DataFrame({"Date": pd.to_datetime(df[date_col], errors="coerce").dt.normalize(),
+                        "Price": pd.to_numeric(df[price_col], errors="coerce")})
+    out = out.dropna().drop_duplicates("Date", keep="last").sort_values("Date")
+    return out.reset_index(drop=True)
+
+class PriceStore:
+    """All symbols' daily prices in two memory-mapped arrays plus a JSON index.
+
+    ``dates.npy`` (datetime64[D]) and ``prices.npy`` (float64) hold every symbol's rows
+    back to back, sorted by date within a symbol; ``index.json`` maps each symbol to its
+    [start, stop) row range and records the CSV it was imported from. The three files live
+    in a generation directory that is never modified once written; the ``CURRENT`` file
+    names the live one. Reads are views into the mapped arrays; a write builds a new
+    generation and swaps ``CURRENT`` with one rename, so concurrent readers and writers
+    always see one writer's arrays with that writer's index. Writers hold a lock on
+    ``LOCK`` for the whole read-modify-write, so concurrent writes never drop each other's rows.
+    """
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        self._dates = self._prices = None
+        self._index = None
+        self._stamp = None
+
+    def _file(self, name, version=None):
+        return os.path.join(self.path, version or "", name)
+
+    def version(self):
+        """Name of the live generation (it changes on every write), or None for an empty store.
+        "." is a store written before generations existed, with its files at the top level."""
+        try:
+            with open(self._file(CURRENT)) as fh:
+                return fh.read().strip() or None
+        except OSError:
+            return "." if os.path.exists(self._file("index.json")) else None
+
+    def _load(self):
+        for attempt in range(3):
+            version = self.version()
+            if version is None:
+                self._index = {"symbols": {}, "sources": {}}
+                self._dates = np.empty(0, dtype="datetime64[D]"); self._prices = np.empty(0)
+                self._stamp = None
+                return
+            if version == self._stamp:
+                return
+            try:
+                with open(self._file("index.json", version)) as fh:
+                    index = json.load(fh)
+                self._dates = np.load(self._file("dates.npy", version), mmap_mode="r")
+                self._prices = np.load(self._file("prices.npy", version), mmap_mode="r")
+            except OSError:
+                if attempt == 2:
+                    raise
+                continue   # a writer replaced and removed this generation meanwhile
+            self._index, self._stamp = index, version
+            return
+
+    def symbols(self):
+        self._load()
+        return sorted(self._index["symbols"])
+
+    def __contains__(self, symbol):
+        self._load()
+        return symbol in self._index["symbols"]
+
+    def read(self, symbol, start=None, end=None):
+        """(dates, prices) read-only views for ``symbol``, optionally limited to [start, end]."""
+        self._load()
+        lo, hi = self._index["symbols"][symbol]
+        d = self._dates[lo:hi]
+        if start is not None:
+            lo += int(np.searchsorted(d, np.datetime64(pd.Timestamp(start).date(), "D"), side="left"))
+        if end is not None:
+            hi = lo + int(np.searchsorted(self._dates[lo:hi], np.datetime64(pd.Timestamp(end).date(), "D"), side="right"))
+        return self._dates[lo:hi], self._prices[lo:hi]
+
+    def series(self, symbol, start=None, end=None) -> pd.Series:
+        d, p = self.read(symbol, start, end)
+        return pd.Series(p, index=pd.DatetimeIndex(d.astype("datetime64[ns]"), name="Date"), name="Price", copy=False)
+
+    def frame(self, symbol, start=None, end=None) -> pd.DataFrame:
+        d, p = self.read(symbol, start, end)
+        return pd.DataFrame({"Date": d.astype("datetime64[ns]"), "Price": np.asarray(p)})
+
+    def _writing(self):
+        return file_lock(self._file("LOCK"))
+
+    def write(self, frames, sources=None):
+        """Replace the rows of each symbol in ``frames`` (symbol -> DataFrame with date/price
+        columns); other symbols are kept. ``sources`` optionally records symbol -> CSV stamp."""
+        new = {sym: normalize_prices(df) for sym, df in frames.items()}
+        with self._writing():
+            self._load()
+            keep = [s for s in self._index["symbols"] if s not in new]
+            dates, prices, syms, pos = [], [], {}, 0
+            for sym in keep:
+                d, p = self.read(sym)
+                dates.append(np.array(d)); prices.append(np.array(p))
+                syms[sym] = [pos, pos + len(d)]; pos += len(d)
+            for sym, df in new.items():
+                dates.append(df["Date"].to_numpy(dtype="datetime64[D]")); prices.append(df["Price"].to_numpy(dtype=float))
+                syms[sym] = [pos, pos + len(df)]; pos += len(df)
+            index = {"symbols": syms, "sources": {**{s: v for s, v in self._index.get("sources", {}).items() if s in syms},
+                                                  **(sources or {})}}
+            previous = self._stamp
+            version = os.path.basename(tempfile.mkdtemp(dir=self.path, prefix="v-"))
+            for name, arr in (("dates.npy", np.concatenate(dates) if dates else np.empty(0, dtype="datetime64[D]")),
+                              ("prices.npy", np.concatenate(prices) if prices else np.empty(0))):
+                with open(self._file(name, version), "wb") as fh:
+                    np.save(fh, arr)
+            with open(self._file("index.json", version), "w") as fh:
+                json.dump(index, fh)
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "w") as fh:
+                fh.write(version)
+            os.replace(tmp, self._file(CURRENT))
+            self._dates = self._prices = None
+            self._stamp = None
+            self._prune(keep={version, previous})
+
+    def _prune(self, keep):
+        """Remove generations other than ``keep`` (the previous one stays for readers that
+        resolved it just before the swap) and a top-level pre-generation store."""
+        for name in os.listdir(self.path):
+            if name.startswith("v-") and name not in keep:
+                shutil.rmtree(self._file(name), ignore_errors=True)
+        if "." not in keep:
+            for name in ("dates.npy", "prices.npy", "index.json"):
+                try:
+                    os.remove(self._file(name))
+                except OSError:
+                    pass
+
+    def import_csv(self, paths, force=False):
+        """Load dataset CSVs into the store, skipping files unchanged since their last import.
+        Returns the symbols that were (re)imported."""
+        self._load()
+        frames, sources = {}, {}
+        for path in paths:
+            sym, stamp = csv_symbol(path), source_stamp(path)
+            if stamp is None:
+                continue
+            if not force and sym in self._index["symbols"] and self._index.get("sources", {}).get(sym) == stamp:
+                continue
+            try:
+                frames[sym] = pd.read_csv(path)
+            except (pd.errors.EmptyDataError, pd.errors.ParserError):
+                continue
+            sources[sym] = stamp
+        if frames:
+            self.write(frames, sources)
+        return sorted(frames)
+
+    def extend(self, deltas, paths):
+        """Merge rows appended to dataset CSVs without re-reading them. ``deltas`` maps a symbol
+        to (stamp of its CSV before the append, the appended Date/Price rows), ``paths`` to its
+        CSV; a symbol whose stored rows did not come from that stamp is re-imported in full."""
+        self._load()
+        frames, sources, stale = {}, {}, []
+        for sym, (before, rows) in deltas.items():
+            if sym in self._index["symbols"] and before is not None and self._index.get("sources", {}).get(sym) == before:
+                frames[sym] = pd.concat([self.frame(sym), normalize_prices(rows)], ignore_index=True)
+                sources[sym] = source_stamp(paths[sym])
+            else:
+                stale.append(paths[sym])
+        if frames:
+            self.write(frames, sources)
+        return sorted(frames) + self.import_csv(stale)
+
+    def export_csv(self, symbol, path):
+        out = self.frame(symbol)
+        out["Date"] = out["Date"].dt.date
+        out.to_csv(path, index=False)
+        return path
@@ -0,0 +1,262 @@
+"""SARIMAX(1,1,1)(0,1,1,m) fitted to many series at once.
+
+The differenced series w = (1-B)(1-B^m) y is an ARMA(1, m+1) whose MA polynomial is
+(1 + theta B)(1 + Theta B^m). Its Kalman filter (statsmodels' state-space form with
+``simple_differencing=True``: approximate diffuse start, the first ``m+2`` observations
+burned) runs over a (series x time) matrix, so one pass evaluates the likelihood of every
+series and parameter set in the batch. The scale is concentrated out; the remaining three
+parameters of all series are estimated together by a batched BFGS whose gradient is a
+forward difference computed in the same pass as three shifted copies of the batch. Once
+every series' filter has converged the rest of the pass is a fixed linear filter
+(scipy.signal.lfilter) instead of the covariance recursion.
+
+    res = fit(Y, m=7)                         # Y: (N, T) prices, NaN-padded on the left
+    res.params                                # (N, 4): ar.L1, ma.L1, ma.S.L7, sigma2
+    mean, var = forecast(Y, res.params, 365)  # predictive moments of the prices
+"""
+from collections import namedtuple
+import numpy as np
+
+INITIAL_VARIANCE = 1e6   # statsmodels' approximate diffuse initialization
+STEADY_TOL = 1e-9        # relative change in the gain column below which the filter is steady
+MAXITER = 100
+GTOL = 1e-5              # on the gradient of the mean negative log-likelihood
+FTOL = 1e-9              # relative decrease of it below which a row stops
+FD_STEP = 1e-6
+MAX_STEP = 0.5           # largest change of any parameter in one BFGS step
+RIDGE_START = 0.9        # second start: ar.L1 = -RIDGE_START, ma.L1 = RIDGE_START
+
+BatchFit = namedtuple("BatchFit", ["params", "llf", "converged", "iterations"])
+
+def difference(Y, m=7):
+    """(1-B)(1-B^m) Y along time; the first m+1 columns (and any touching a NaN) are NaN."""
+    W = np.full(Y.shape, np.nan)
+    W[:, m+1:] = Y[:, m+1:] - Y[:, m:-1] - Y[:, 1:-m] + Y[:, :-m-1]
+    return W
+
+def _ma(x, m):
+    """Columns 1..m+1 of the selection vector R = [1, c_1, ..., c_{m+1}] for parameters x (B, 3)."""
+    c = np.zeros((len(x), m+1))
+    c[:, 0] = x[:, 1]
+    c[:, m-1] = x[:, 2]
+    c[:, m] = x[:, 1]*x[:, 2]
+    return c
+
+def _steady_innovations(phi, K, w_tail, w_hist, v_hist):
+    """One-step errors of a converged filter on ``w_tail``, given the last r inputs and errors."""
+    from scipy.signal import lfilter, lfiltic, ss2tf
+    r = len(K)
+    A = np.zeros((r, r))
+    A[0, 0] = phi
+    A[np.arange(r-1), np.arange(1, r)] = 1.0
+    A[:, 0] -= K
+    num, den = ss2tf(A, K[:, None], -np.eye(1, r), np.ones((1, 1)))
+    zi = lfiltic(num[0], den, v_hist[::-1], w_hist[::-1])
+    return lfilter(num[0], den, w_tail, zi=zi)[0]
+
+def _filter(W, x, m, steady=True, final=False):
+    """Concentrated Kalman filter of ARMA(1, m+1) on each row of W with parameters x (B, 3).
+
+    Returns (llf, sigma2), plus the predicted state (B, r) and its unit-scale covariance
+    (B, r, r) after the last column when ``final`` (which also skips the steady-state
+    shortcut). Arrays are laid out with the batch last so each update is a few contiguous
+    whole-array operations; T's shift structure replaces the matrix products."""
+    B, T = W.shape
+    r = m + 2
+    phi = x[:, 0]
+    # R = [1, theta, 0, ..., Theta, theta*Theta]: Q = R R' is non-zero only on those four indices
+    nz = np.array([0, 1, m, m+1])
+    R = np.concatenate([np.ones((B, 1)), _ma(x, m)], axis=1).T[nz]
+    Q = R[:, None, :]*R[None, :, :]
+    qi, qj = nz[:, None], nz[None, :]
+    ok_all = np.isfinite(W)
+    first = np.where(ok_all.any(axis=1), np.argmax(ok_all, axis=1), T)
+    starts = {}
+    for i, t in enumerate(first):
+        starts.setdefault(int(t), []).append(i)
+    okf = ok_all.T.astype(float)
+    W0 = np.where(ok_all, W, 0.0).T
+    # likelihood terms start after each row's first r observations (statsmodels' burn-in)
+    use = okf * (np.cumsum(okf, axis=0) > r)
+    gaps = np.flatnonzero(~ok_all[:, first.max():].all(axis=0)) if B and first.max() < T else []
+    # the shortcut needs every row started, past its burn-in and free of missing values
+    steady_from = first.max() + (int(gaps[-1]) + 1 if len(gaps) else 0) + r if B else T
+    a = np.zeros((r, B))
+    P0 = INITIAL_VARIANCE*np.eye(r)[:, :, None]
+    P = np.repeat(P0, B, axis=2)
+    spare = np.empty_like(P)   # P is rebuilt into the other buffer each step
+    ssq, logf = np.zeros(B), np.zeros(B)
+    v_ring, w_ring = np.zeros((r, B)), np.zeros((r, B))
+    gain_prev, calm = None, 0
+    t = int(first.min()) if B else T
+    with np.errstate(all="ignore"):   # rows that have not started yet may overflow
+        while t < T:
+            if t in starts:
+                rows = starts[t]
+                a[:, rows], P[:, :, rows] = 0.0, P0
+            Pz = P[:, 0].copy()
+            F = Pz[0]
+            v = W0[t] - a[0]
+            g = okf[t] / F
+            u = use[t]
+            ssq += np.where(u > 0, v*v*g, 0.0)
+            logf += np.where(u > 0, np.log(F), 0.0)
+            v_ring[t % r], w_ring[t % r] = v, W[:, t]
+            Kg = Pz*g
+            af = a + Kg*v
+            a[0] = phi*af[0] + af[1]
+            a[1:-1] = af[2:]
+            a[-1] = 0.0
+            # P <- T (P - Kg Pz') T' + Q, written out for T's shift structure: the inner block
+            # moves up and left by one, and row/column 0 come from rows 0 and 1 of the update
+            top = P[:2] - Kg[:2, None]*Pz[None]
+            T0 = phi*top[0] + top[1]
+            np.subtract(P[2:, 2:], Kg[2:, None]*Pz[None, 2:], out=spare[1:-1, 1:-1])
+            spare[0, 0] = phi*T0[0] + T0[1]
+            spare[1:-1, 0] = spare[0, 1:-1] = T0[2:]
+            spare[-1] = spare[:, -1] = 0.0
+            spare[qi, qj] += Q
+            P, spare = spare, P
+            t += 1
+            if final or not steady or t < steady_from:
+                continue
+            gain = P[:, 0] / P[0, 0]
+            calm = calm + 1 if gain_prev is not None and np.abs(gain - gain_prev).max() < STEADY_TOL else 0
+            gain_prev = gain
+            if calm >= r:
+                break
+    n = use.sum(axis=0)
+    if t < T:
+        # converged: the remaining errors come from a fixed linear filter of w
+        F = P[0, 0]
+        K = P[:, 0] / F
+        K = np.concatenate([(phi*K[0] + K[1])[None], K[2:], np.zeros((1, B))])
+        order = np.arange(t - r, t) % r
+        for i in range(B):
+            tail = _steady_innovations(phi[i], K[:, i], W[i, t:], w_ring[order, i], v_ring[order, i])
+            ssq[i] += np.dot(tail, tail)/F[i]
+            logf[i] += len(tail)*np.log(F[i])
+    n = np.maximum(n, 1)
+    sigma2 = ssq/n
+    llf = -0.5*n*(np.log(2*np.pi) + np.log(sigma2) + 1.0) - 0.5*logf
+    if final:
+        return llf, sigma2, a.T.copy(), P.transpose(2, 0, 1).copy()
+    return llf, sigma2
+
+def _start(W, m):
+    """Start values: no AR term and each MA coefficient from the lag-1 / lag-m autocorrelation
+    of w as if it were a pure MA(1) at that lag."""
+    Wc = W - np.nanmean(W, axis=1, keepdims=True)
+    den = np.nansum(Wc*Wc, axis=1)
+    def ma(k):
+        rho = np.clip(np.nansum(Wc[:, k:]*Wc[:, :-k], axis=1) / np.maximum(den, 1e-300), -0.49, 0.49)
+        safe = np.where(np.abs(rho) < 1e-8, 1.0, rho)
+        return np.where(np.abs(rho) < 1e-8, 0.0, (1 - np.sqrt(1 - 4*rho*rho)) / (2*safe))
+    return np.column_stack([np.zeros(len(W)), ma(1), ma(m)])
+
+def _bfgs(W, n, x, m, maxiter, gtol, ftol):
+    """Batched BFGS from start values x (B, 3) on the rows of W; returns (x, f, converged,
+    iterations) with f the mean negative log-likelihood."""
+    N = len(W)
+    E = FD_STEP*np.eye(3)
+
+    def evaluate(rows, X):
+        batch = np.concatenate([X, X + E[0], X + E[1], X + E[2]])
+        llf, _ = _filter(np.tile(W[rows], (4, 1)), batch, m)
+        f = (-llf / np.tile(n[rows], 4)).reshape(4, len(rows))
+        f[~np.isfinite(f)] = np.inf
+        return f[0], (f[1:] - f[0]).T / FD_STEP
+
+    x = x.copy()
+    active = np.arange(N)
+    f, g = evaluate(active, x)
+    H = np.repeat(np.eye(3)[None], N, axis=0)
+    step = np.ones(N)
+    fresh = np.ones(N, dtype=bool)   # H not yet scaled by the first curvature pair
+    converged = np.zeros(N, dtype=bool)
+    iterations = np.zeros(N, dtype=int)
+    for _ in range(maxiter):
+        active = active[~(converged[active] | (step[active] < 1e-10))]
+        if not len(active):
+            break
+        d = -np.einsum("nij,nj->ni", H[active], g[active])
+        uphill = np.einsum("ni,ni->n", d, g[active]) >= 0
+        if uphill.any():
+            H[active[uphill]] = np.eye(3)
+            d[uphill] = -g[active[uphill]]
+        d *= np.minimum(1.0, MAX_STEP / np.maximum(np.abs(d).max(axis=1), 1e-300))[:, None]
+        trial = x[active] + step[active, None]*d
+        f_new, g_new = evaluate(active, trial)
+        iterations[active] += 1
+        ok = f_new <= f[active] + 1e-4*step[active]*np.einsum("ni,ni->n", d, g[active])
+        step[active[~ok]] *= 0.25
+        rows = active[ok]
+        s, y = trial[ok] - x[rows], g_new[ok] - g[rows]
+        sy = np.einsum("ni,ni->n", s, y)
+        curv = sy > 1e-12
+        for i, row in enumerate(rows):
+            if not curv[i]:
+                continue
+            if fresh[row]:
+                H[row] = np.eye(3) * sy[i] / np.dot(y[i], y[i])
+                fresh[row] = False
+            rho = 1.0 / sy[i]
+            V = np.eye(3) - rho*np.outer(s[i], y[i])
+            H[row] = V @ H[row] @ V.T + rho*np.outer(s[i], s[i])
+        converged[rows] = ((np.abs(g[rows]).max(axis=1) < gtol)
+                           | (f[rows] - f_new[ok] <= ftol*np.maximum(np.abs(f_new[ok]), 1.0)))
+        x[rows], f[rows], g[rows], step[rows] = trial[ok], f_new[ok], g_new[ok], 1.0
+    return x, f, converged, iterations
+
+def fit(Y, m=7, maxiter=MAXITER, gtol=GTOL, ftol=FTOL):
+    """Estimate SARIMAX(1,1,1)(0,1,1,m) for every row of the price matrix Y (N, T). Returns a
+    BatchFit with params (N, 4) in statsmodels' order and the log-likelihood of each series.
+
+    Every iteration is one filter pass over the rows still being optimized, evaluating each
+    row's trial point and its three forward-difference neighbours; rows stop on their own
+    once their gradient is below ``gtol``, a step gains less than ``ftol`` (relative) or
+    their line search fails. Every row is fitted twice, from _start and from the far end of
+    the ar.L1 = -ma.L1 ridge (RIDGE_START), and keeps the fit with the higher likelihood:
+    the ridge often holds a second optimum that the first start cannot reach."""
+    W = difference(np.asarray(Y, dtype=float), m)
+    N, k = len(W), 2
+    n = np.maximum(np.isfinite(W).sum(axis=1) - (m + 2), 1)
+    x0 = np.tile(_start(W, m), (k, 1))
+    x0[N:, :2] = -RIDGE_START, RIDGE_START
+    x, f, converged, iterations = _bfgs(np.tile(W, (k, 1)), np.tile(n, k), x0, m, maxiter, gtol, ftol)
+    best = np.argmin(f.reshape(k, N), axis=0)*N + np.arange(N)
+    x, converged, iterations = x[best], converged[best], iterations[best]
+    llf, sigma2 = _filter(W, x, m)
+    return BatchFit(np.column_stack([x, sigma2]), llf, converged, iterations)
+
+def forecast(Y, params, h, m=7):
+    """Predictive mean and variance (N, h) of the prices for the h steps after Y's last column."""
+    Y = np.asarray(Y, dtype=float)
+    N, r, L = len(Y), m + 2, m + 1
+    x, sigma2 = params[:, :3], params[:, 3]
+    _, _, a, P = _filter(difference(Y, m), x, m, final=True)
+    # state: the ARMA state of w and the last m+1 prices; y_t = w_t + y_{t-1} + y_{t-m} - y_{t-m-1}
+    k = r + L
+    c = np.zeros(k)
+    c[0], c[r], c[r+m-1], c[r+m] = 1.0, 1.0, 1.0, -1.0
+    M = np.zeros((N, k, k))
+    M[:, 0, 0] = x[:, 0]
+    M[:, np.arange(r-1), np.arange(1, r)] = 1.0
+    M[:, r, :] = c
+    M[:, np.arange(r+1, k), np.arange(r, k-1)] = 1.0
+    R = np.concatenate([np.ones((N, 1)), _ma(x, m), np.zeros((N, L))], axis=1)
+    Q = sigma2[:, None, None]*R[:, :, None]*R[:, None, :]
+    s = np.concatenate([a, Y[:, :-L-1:-1]], axis=1)
+    S = np.zeros((N, k, k))
+    S[:, :r, :r] = sigma2[:, None, None]*P
+    mean, var = np.empty((N, h)), np.empty((N, h))
+    for i in range(h):
+        mean[:, i] = s @ c
+        var[:, i] = np.einsum("i,nij,j->n", c, S, c)
+        s = np.einsum("nij,nj->ni", M, s)
+        S = M @ S @ M.transpose(0, 2, 1) + Q
+    return mean, var
+
+def sarimax_batch(Y, h, m=7):
+    """fast_models-style entry point: fit every row of Y and forecast h steps."""
+    return forecast(Y, fit(Y, m).params, h, m)
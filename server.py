@@ -0,0 +1,312 @@
+"""Local JSON forecast service over the price store, with fitted models kept in memory.
+
+    python server.py data/*.csv data/stocks/*.csv --port 8765 --workers 4
+
+    GET /health
+    GET /symbols
+    GET /forecast?symbol=KRBL_NS&horizons=7,30&model=sarimax&policy=full-daily
+    GET /forecast/exog?symbol=rough_rice_yahoo&horizons=7,30
+
+Every symbol is fitted once, for the longest horizon, on a process pool; the predictive
+distribution and each serialized response stay in memory until the symbol's data changes,
+so repeated queries are answered without touching the model. A watcher re-imports the
+given CSVs into the store every ``--poll`` seconds, and a changed store is noticed on the
+next request as well.
+"""
+import argparse, json, sys, threading, time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np, pandas as pd
+from batch import DEFAULT_WORKERS, process_pool
+from distribution import ForecastDistribution
+from fast_models import MODELS as FAST_MODELS
+from fit_cache import series_key
+from model import HORIZONS, WINDOW_POLICIES
+from price_store import PriceStore
+
+MAX_HORIZON = max(HORIZONS)
+EXOG_TTL = 3600   # seconds the news/weather features are reused before being rebuilt
+
+Warm = namedtuple("Warm", ["version", "value"])   # a fitted model's output and the data version it is for
+
+class BadRequest(ValueError):
+    pass
+
+class UnknownSymbol(KeyError):
+    pass
+
+def _fit(dates, prices, model, policy):
+    """Pool worker: predictive (mean, var, last_date) for MAX_HORIZON days."""
+    from model import forecast_distribution
+    s = pd.Series(prices, index=pd.DatetimeIndex(dates), dtype=float)
+    dist = forecast_distribution(s, MAX_HORIZON, policy=WINDOW_POLICIES[policy], model=model)
+    if dist is None:
+        raise BadRequest("series too short to forecast")
+    return dist.mean, dist.var, dist.dates[0]
+
+def _fit_exog(frame, past, future, horizons):
+    from model_exog import multi_forecast_with_exog
+    return multi_forecast_with_exog(frame, past, future, horizons=horizons)
+
+def _horizons(horizons):
+    horizons = tuple(sorted(set(int(h) for h in horizons)))
+    if not horizons or horizons[0] < 1 or horizons[-1] > MAX_HORIZON:
+        raise BadRequest(f"horizons must be between 1 and {MAX_HORIZON}")
+    return horizons
+
+def _rows(df):
+    out = df.copy()
+    out["date"] = pd.to_datetime(out["date"]).dt.strftime("%Y-%m-%d")
+    return out.to_dict("records")
+
+class ForecastService:
+    """Warm models and cached responses per (symbol, model, policy), invalidated by a content
+    hash of the symbol's series whenever the store's index changes."""
+
+    def __init__(self, store=None, paths=(), workers=DEFAULT_WORKERS):
+        self.store = store or PriceStore()
+        self.paths = list(paths)
+        self.pool = process_pool(max(1, workers))
+        self._lock = threading.Lock()
+        self._store_lock = threading.Lock()
+        self._exog_lock = threading.Lock()   # one feature build at a time; the others reuse it
+        self._stamp = object()
+        self._versions = {}     # symbol -> data hash
+        self._models = {}       # (symbol, model, policy) -> Warm
+        self._inflight = {}     # (symbol, model, policy) -> (version, Future)
+        self._responses = {}    # (kind, symbol, ...) -> (version, bytes)
+        self._exog = None       # (built_at, past, future)
+        self.refresh()
+
+    def _index_stamp(self):
+        return self.store.version()
+
+    def refresh(self, import_csv=False):
+        """Re-import the watched CSVs (with ``import_csv``) and, if the store changed, rehash
+        every symbol and drop models whose data changed. Returns the changed symbols."""
+        with self._store_lock:
+            if import_csv and self.paths:
+                self.store.import_csv(self.paths)
+            stamp = self._index_stamp()
+            if stamp == self._stamp:
+                return []
+            versions = {sym: series_key(self.store.series(sym), {}) for sym in self.store.symbols()}
+        with self._lock:
+            changed = [s for s in set(versions) | set(self._versions) if versions.get(s) != self._versions.get(s)]
+            self._versions, self._stamp = versions, stamp
+            self._models = {k: w for k, w in self._models.items() if versions.get(k[0]) == w.version}
+            self._responses = {k: r for k, r in self._responses.items() if versions.get(k[1]) == r[0]}
+        return sorted(changed)
+
+    def symbols(self):
+        return sorted(self._versions)
+
+    def stats(self):
+        return {"symbols": len(self._versions), "models": len(self._models), "responses": len(self._responses)}
+
+    def _version(self, symbol):
+        if self._index_stamp() != self._stamp:
+            self.refresh()
+        version = self._versions.get(symbol)
+        if version is None:
+            raise UnknownSymbol(symbol)
+        return version
+
+    def distribution(self, symbol, model="sarimax", policy="full-daily"):
+        """ForecastDistribution for the MAX_HORIZON days after ``symbol``'s last price."""
+        if model != "sarimax" and model not in FAST_MODELS:
+            raise BadRequest(f"unknown model {model!r}")
+        if policy not in WINDOW_POLICIES:
+            raise BadRequest(f"unknown policy {policy!r}")
+        version = self._version(symbol)
+        def start():
+            with self._store_lock:
+                d, p = self.store.read(symbol)
+                d, p = np.array(d), np.array(p)
+            return self.pool.submit(_fit, d, p, model, policy)
+        def finish(r):
+            mean, var, first = r
+            return ForecastDistribution(pd.date_range(first, periods=len(mean), freq="D"), mean, var)
+        return self._shared_fit((symbol, model, policy), version, start, finish)
+
+    def _shared_fit(self, key, version, start, finish):
+        """``finish(result)`` of the fit for ``key`` (symbol first) at data ``version``: kept in
+        memory once done, and shared while running, so concurrent requests for the same model
+        wait on one fit. ``start()`` submits a new fit and returns its Future."""
+        with self._lock:
+            warm = self._models.get(key)
+            if warm is not None and warm.version == version:
+                return warm.value
+            pending = self._inflight.get(key)
+            if pending is None or pending[0] != version:
+                pending = (version, start())
+                self._inflight[key] = pending
+        try:
+            value = finish(pending[1].result())
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is pending:
+                    del self._inflight[key]
+        with self._lock:
+            if self._versions.get(key[0]) == version:
+                self._models[key] = Warm(version, value)
+        return value
+
+    def forecast(self, symbol, horizons=HORIZONS, model="sarimax", policy="full-daily"):
+        """JSON bytes of multi_forecast_ci-style frames for ``horizons``."""
+        horizons = _horizons(horizons)
+        key = ("forecast", symbol, model, policy, horizons)
+        version = self._version(symbol)
+        hit = self._responses.get(key)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+        frames = self.distribution(symbol, model, policy).frames(horizons)
+        body = json.dumps({"symbol": symbol, "model": model, "policy": policy,
+                           "forecasts": {str(h): _rows(df) for h, df in frames.items()}}).encode("utf-8")
+        with self._lock:
+            self._responses[key] = (version, body)
+        return body
+
+    def _exog_features(self):
+        with self._exog_lock:
+            with self._lock:
+                if self._exog is not None and time.time() - self._exog[0] < EXOG_TTL:
+                    return self._exog
+            from news_weather import assemble_exog
+            past, future, failed = assemble_exog(days_back=120, days_forward=16)
+            with self._lock:
+                self._exog = (time.time(), past, future, sorted(failed))
+            return self._exog
+
+    def forecast_exog(self, symbol, horizons=HORIZONS):
+        horizons = _horizons(horizons)
+        version = self._version(symbol)
+        built, past, future, failed = self._exog_features()
+        key = ("exog", symbol, horizons, built)
+        hit = self._responses.get(key)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+        def start():
+            with self._store_lock:
+                frame = self.store.frame(symbol)
+            return self.pool.submit(_fit_exog, frame, past, future, [MAX_HORIZON])
+        # one fit per symbol, data version and feature build, for MAX_HORIZON days
+        full = self._shared_fit((symbol, "exog", built), version, start, lambda outs: outs[MAX_HORIZON])
+        outs = {h: full.iloc[:h] for h in horizons}
+        body = json.dumps({"symbol": symbol, "model": "sarimax+exog", "failed_sources": failed,
+                           "forecasts": {str(h): _rows(outs[h]) for h in horizons}}).encode("utf-8")
+        with self._lock:
+            self._responses = {k: r for k, r in self._responses.items() if k[0] != "exog" or k[3] == built}
+            self._responses[key] = (version, body)
+            self._models = {k: w for k, w in self._models.items() if k[1] != "exog" or k[2] == built}
+        return body
+
+    def warm(self, model="sarimax", policy="full-daily"):
+        for sym in self.symbols():
+            try:
+                self.distribution(sym, model, policy)
+            except Exception as e:
+                print(f"warm {sym}: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def watch(self, every=5.0, stop=None):
+        """Poll the watched CSVs and store every ``every`` seconds, refitting changed symbols."""
+        stop = stop or threading.Event()
+        while not stop.wait(every):
+            try:
+                for sym in self.refresh(import_csv=True):
+                    if sym in self._versions:
+                        self.distribution(sym)
+            except Exception as e:
+                print(f"watch: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def _params(query):
+    q = {k: v[-1] for k, v in parse_qs(query).items()}
+    try:
+        horizons = [int(h) for h in q.get("horizons", ",".join(map(str, HORIZONS))).split(",") if h.strip()]
+    except ValueError:
+        raise BadRequest("horizons must be comma-separated integers")
+    return q, horizons
+
+class Handler(BaseHTTPRequestHandler):
+    service = None
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, code, body):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, code, msg):
+        self._send(code, json.dumps({"error": msg}).encode("utf-8"))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        svc = self.service
+        try:
+            if url.path == "/health":
+                return self._send(200, json.dumps({"status": "ok", **svc.stats()}).encode("utf-8"))
+            if url.path == "/symbols":
+                return self._send(200, json.dumps(svc.symbols()).encode("utf-8"))
+            q, horizons = _params(url.query)
+            if "symbol" not in q:
+                raise BadRequest("symbol is required")
+            if url.path == "/forecast":
+                return self._send(200, svc.forecast(q["symbol"], horizons, q.get("model", "sarimax"),
+                                                    q.get("policy", "full-daily")))
+            if url.path == "/forecast/exog":
+                return self._send(200, svc.forecast_exog(q["symbol"], horizons))
+            self._error(404, f"no route {url.path}")
+        except UnknownSymbol as e:
+            self._error(404, f"unknown symbol {e.args[0]!r}")
+        except BadRequest as e:
+            self._error(400, str(e))
+        except Exception as e:
+            self._error(500, f"{type(e).__name__}: {e}")
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+def serve(service, host="127.0.0.1", port=8765, poll=5.0, verbose=False):
+    Handler.service = service
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    httpd.verbose = verbose
+    stop = threading.Event()
+    threading.Thread(target=service.watch, args=(poll, stop), daemon=True).start()
+    try:
+        httpd.serve_forever()
+    finally:
+        stop.set()
+        httpd.server_close()
+        service.close()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serve forecasts for the price store as JSON.")
+    ap.add_argument("paths", nargs="*", help="dataset CSVs to import into the store and watch")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    ap.add_argument("--poll", type=float, default=5.0, help="seconds between data checks")
+    ap.add_argument("--warm", action="store_true", help="fit every symbol before serving")
+    ap.add_argument("--verbose", action="store_true", help="log every request")
+    args = ap.parse_args(argv)
+    service = ForecastService(paths=args.paths, workers=args.workers)
+    service.refresh(import_csv=True)
+    if args.warm:
+        service.warm()
+    print(f"serving {len(service.symbols())} symbols on http://{args.host}:{args.port}", flush=True)
+    try:
+        serve(service, args.host, args.port, args.poll, args.verbose)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,16 @@
 
-import os, json, math
+import contextlib, itertools, os, json, math
 import streamlit as st, pandas as pd
 from fetchers import fetch_yahoo_rough_rice, fetch_worldbank_pinksheet_rice, fetch_stocks_to_csv
 from model import multi_forecast_ci, HORIZONS
+from batch import DEFAULT_WORKERS, BatchResult, dataset_name, forecast_files
+from fast_models import MODELS as FAST_MODELS
+from price_store import PriceStore, csv_symbol
 from news_tab import news_tab
 from news_weather import assemble_exog
-from model_exog import forecast_with_exog
+from materialize import load_forecasts
+from distribution import ForecastDistribution
+import tracing
 
 st.set_page_config(page_title="International Rice & Basmati Company Forecasts", page_icon="🌾", layout="wide")
 st.title("🌾 International Rice & Basmati Company Forecasts")
@@ -30,11 +35,35 @@ def kpi_block(latest_actual, first_fore, last_fore, unit=""):
 # Load presets
 cfg = json.load(open("config.json")) if os.path.exists("config.json") else {"company_groups":{}}
 groups = cfg.get("company_groups", {})
-
-tab1, tab2, tab3 = st.tabs(["Rice Benchmarks", "Company Stocks", "🗞 News & Weather"])
+store = PriceStore()
+
+def load_prices(path):
+    """Dataset as a Date/Price frame from the price store, importing the CSV if it changed."""
+    store.import_csv([path])
+    sym = csv_symbol(path)
+    return store.frame(sym) if sym in store else pd.read_csv(path)
+
+# Profiling: collect the spans of this rerun and show them in the sidebar at the end
+profile = st.sidebar.checkbox("Profile this rerun", help="Time fetch, feature and forecast steps; spans are also appended to .cache/trace.jsonl.")
+profiler = contextlib.ExitStack()
+if profile:
+    spans = profiler.enter_context(tracing.collect(".cache/trace.jsonl"))
+    profiler.enter_context(tracing.span("rerun"))
+
+def profile_panel(spans):
+    rows = [{"span": "\u2003"*depth + rec["name"], "ms": round(rec["duration_ms"], 1),
+             "attrs": ", ".join(f"{k}={v}" for k, v in rec["attrs"].items()) + (f" error={rec['error']}" if rec["error"] else "")}
+            for depth, rec in tracing.tree(spans)]
+    st.sidebar.markdown("### Profile")
+    if not rows:
+        st.sidebar.caption("No spans recorded.")
+        return
+    st.sidebar.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+    by_name = pd.DataFrame(spans).groupby("name")["duration_ms"].agg(["count", "sum"]).sort_values("sum", ascending=False)
+    st.sidebar.dataframe(by_name.round(1), use_container_width=True)
 
 # ---------- Rice Benchmarks ----------
-with tab1:
+def rice_section():
     st.subheader("Sources")
     colA, colB = st.columns(2)
     with colA:
@@ -50,18 +79,31 @@ with tab1:
 
     path = "data/rough_rice_yahoo.csv" if choice.startswith("Yahoo") else "data/rice_wb_thai5.csv"
     if os.path.exists(path):
-        df = pd.read_csv(path)
+        df = load_prices(path)
         st.markdown("### Latest data")
         st.dataframe(df.tail(30), use_container_width=True)
         labels = {7:"1 Week", 30:"1 Month", 180:"6 Months", 365:"1 Year"}
 
         if not use_exog:
-            outs = multi_forecast_ci(df, horizons=HORIZONS)
+            # nightly artifacts (materialize.py) are served when they match this data
+            outs = load_forecasts(dataset_name(path), df)
+            if outs is None:
+                outs = multi_forecast_ci(df, horizons=HORIZONS)
             latest_actual = pd.to_numeric(df["Price"], errors="coerce").dropna().iloc[-1] if not df.empty else float('nan')
             first_fore = outs[7]["mean"].iloc[0] if not outs[7].empty else float('nan')
             last_fore  = outs[365]["mean"].iloc[-1] if not outs[365].empty else float('nan')
             kpi_block(latest_actual, first_fore, last_fore)
 
+            if not outs[365].empty:
+                with st.expander("Scenario: chance of crossing a price"):
+                    dist = ForecastDistribution.from_frame(outs[365])
+                    sc1, sc2 = st.columns(2)
+                    level = sc1.number_input("Price level", value=float(round(latest_actual*1.05, 2)))
+                    days = sc2.slider("Within days", 1, 365, 30)
+                    window = dist.horizon(days)
+                    st.write(f"P(price above {fmt(level)} on some day within {days} days): "
+                             f"**{window.prob_exceeds(level):.1%}** · on day {days}: **{float(window.prob_above(level)[-1]):.1%}**")
+
             st.markdown("### Forecasts")
             cols = st.columns(4)
             for i, h in enumerate(HORIZONS):
@@ -75,13 +117,19 @@ with tab1:
                     st.download_button(f"Download {labels[h]}", data=plot_df.to_csv(index=False).encode("utf-8"),
                                        file_name=f"{'yahoo' if choice.startswith('Yahoo') else 'worldbank'}_forecast_{h}d.csv", mime="text/csv", key=f"dlf_rice_{h}")
         else:
-            st.info("Building exogenous features (news sentiment + weather)…")
-            past, future = assemble_exog(days_back=120, days_forward=16)
+            outs = load_forecasts(dataset_name(path), df, variant="exog")
+            if outs is None:
+                st.info("Building exogenous features (news sentiment + weather)…")
+                from model_exog import multi_forecast_with_exog
+                past, future, failed = assemble_exog(days_back=120, days_forward=16)
+                if failed:
+                    st.warning("Some feature sources failed; forecasting with the rest: " + ", ".join(failed))
+                outs = multi_forecast_with_exog(df, past, future, horizons=HORIZONS)
             cols = st.columns(4)
             for i, h in enumerate(HORIZONS):
                 with cols[i]:
                     st.markdown(f"**{labels[h]} (exog)**")
-                    out = forecast_with_exog(df, past, future, horizon_days=h)
+                    out = outs[h]
                     if out.empty:
                         st.warning("No exogenous forecast available.")
                         continue
@@ -95,7 +143,7 @@ with tab1:
         st.info("Click a fetch button above to download data.")
 
 # ---------- Company Stocks ----------
-with tab2:
+def stocks_section():
     st.subheader("Ticker groups")
     presets = ["(none)"] + list(groups.keys())
     preset = st.selectbox("Preset groups", options=presets)
@@ -104,7 +152,7 @@ with tab2:
     if st.button("Fetch stock data"):
         tk = [t.strip() for t in tickers.split(",") if t.strip()]
         res = fetch_stocks_to_csv(tk, out_dir="data/stocks")
-        st.success(f"Saved {len(res)} files") if res else st.error("No tickers returned data.")
+        st.success(f"Updated {len(res)} files") if res else st.info("No ticker returned new data.")
 
     import glob
     files = sorted(glob.glob("data/stocks/*.csv"))
@@ -112,30 +160,57 @@ with tab2:
     if not files:
         st.info("No stock files yet. Enter tickers and click 'Fetch stock data'.")
     else:
+        mc1, mc2 = st.columns(2)
+        stock_model = mc1.selectbox("Model", ["sarimax"] + list(FAST_MODELS), help="Fast models fit all tickers in one vectorized pass.")
+        workers = mc2.number_input("Parallel workers", min_value=1, max_value=32, value=DEFAULT_WORKERS)
+        store.import_csv(files)   # one store rewrite for every changed file, not one per file
+        slots, pending, ready = {}, {}, []
         for path in files:
-            name = os.path.basename(path).replace(".csv","")
-            st.markdown(f"### {name}")
-            df = pd.read_csv(path)
-            st.dataframe(df.tail(10), use_container_width=True)
-            outs = multi_forecast_ci(df, horizons=HORIZONS)
-
-            latest_actual = pd.to_numeric(df.iloc[:, -1], errors="coerce").dropna().iloc[-1] if not df.empty else float('nan')
-            first_fore = outs[7]["mean"].iloc[0] if not outs[7].empty else float('nan')
-            last_fore  = outs[365]["mean"].iloc[-1] if not outs[365].empty else float('nan')
-            kpi_block(latest_actual, first_fore, last_fore, unit="")
-
-            cols = st.columns(4)
-            for i, h in enumerate(HORIZONS):
-                with cols[i]:
-                    st.markdown(f"**{labels[h]}**")
-                    plot_df = outs[h].copy()
-                    plot_df["date"] = pd.to_datetime(plot_df["date"])
-                    st.line_chart(data=plot_df.set_index("date")[["mean","lower80","upper80"]])
-                    with st.expander("Show table"):
-                        st.dataframe(plot_df.head(), use_container_width=True)
-                    st.download_button(f"Download {labels[h]}", data=plot_df.to_csv(index=False).encode("utf-8"),
-                                       file_name=f"{name}_forecast_{h}d.csv", mime="text/csv", key=f"dlf_{name}_{h}")
-
-# ---------- News & Weather ----------
-with tab3:
-    news_tab()
+            slots[path] = st.container()
+            with slots[path]:
+                st.markdown(f"### {dataset_name(path)}")
+                pending[path] = st.empty()
+                pending[path].caption("Forecasting…")
+            if stock_model == "sarimax":
+                outs = load_forecasts(dataset_name(path), load_prices(path))
+                if outs is not None:
+                    ready.append(BatchResult(path, dataset_name(path), outs, None, 0.0))
+        # precomputed tickers first; the rest are fitted in worker processes and drawn as each finishes
+        stale = [p for p in files if p not in {r.path for r in ready}]
+        live = forecast_files(stale, horizons=HORIZONS, workers=int(workers), timeout=600, model=stock_model)
+        for res in itertools.chain(ready, live):
+            name = res.name
+            pending[res.path].empty()
+            with slots[res.path]:
+                df = load_prices(res.path)
+                st.dataframe(df.tail(10), use_container_width=True)
+                if res.error:
+                    st.error(f"Forecast failed: {res.error}")
+                    continue
+                outs = res.outs
+
+                latest_actual = pd.to_numeric(df.iloc[:, -1], errors="coerce").dropna().iloc[-1] if not df.empty else float('nan')
+                first_fore = outs[7]["mean"].iloc[0] if not outs[7].empty else float('nan')
+                last_fore  = outs[365]["mean"].iloc[-1] if not outs[365].empty else float('nan')
+                kpi_block(latest_actual, first_fore, last_fore, unit="")
+
+                cols = st.columns(4)
+                for i, h in enumerate(HORIZONS):
+                    with cols[i]:
+                        st.markdown(f"**{labels[h]}**")
+                        plot_df = outs[h].copy()
+                        plot_df["date"] = pd.to_datetime(plot_df["date"])
+                        st.line_chart(data=plot_df.set_index("date")[["mean","lower80","upper80"]])
+                        with st.expander("Show table"):
+                            st.dataframe(plot_df.head(), use_container_width=True)
+                        st.download_button(f"Download {labels[h]}", data=plot_df.to_csv(index=False).encode("utf-8"),
+                                           file_name=f"{name}_forecast_{h}d.csv", mime="text/csv", key=f"dlf_{name}_{h}")
+
+# Only the selected section runs on a rerun (st.tabs would run all three every time)
+SECTIONS = {"Rice Benchmarks": rice_section, "Company Stocks": stocks_section, "🗞 News & Weather": news_tab}
+section = st.radio("Section", list(SECTIONS), horizontal=True, label_visibility="collapsed", key="section")
+SECTIONS[section]()
+
+if profile:
+    profiler.close()
+    profile_panel(spans)
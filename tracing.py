@@ -0,0 +1,192 @@
+"""Nested timing spans for the fetch, feature and forecast hot paths.
+
+    with span("weather.archive", region=name) as sp:
+        ...
+        sp.set(rows=len(df), cache_hit=False)
+
+Spans are recorded process-wide once ``RICE_TRACE`` names a JSONL file or ``enable()`` is
+called, and otherwise only inside a ``collect()`` block (and the threads it hands work to
+through ``submit``), so one Streamlit session profiling a rerun does not turn tracing on
+for the others. Elsewhere ``span()`` hands back one shared no-op object, so an
+instrumented call costs a global and a context variable lookup. Every finished span is
+one JSON object (name, id, parent, trace, start, duration_ms, attrs, error); it is passed
+to the ``collect()`` block it ran under, which is how the app builds its per-rerun panel,
+and appended to the trace file of ``enable()`` and to the one given to that block, if any.
+"""
+import contextlib, contextvars, functools, itertools, json, os, threading, time
+
+_enabled = False
+_path = None
+_fh = None
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_current = contextvars.ContextVar("rice_trace_span", default=None)
+_trace = contextvars.ContextVar("rice_trace_id", default=None)
+_collectors = []
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def incr(self, key, n=1):
+        pass
+
+NOOP = _NoSpan()
+
+class Span:
+    __slots__ = ("name", "attrs", "id", "parent", "trace", "start", "_t0", "_token")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        parent = _current.get()
+        self.id = f"{os.getpid()}.{next(_ids)}"  # unique across pool workers
+        self.parent = parent.id if parent is not None else None
+        self.trace = _trace.get()
+        self.start = time.time()
+        self._token = _current.set(self)
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ms = (time.perf_counter() - self._t0) * 1000
+        _current.reset(self._token)
+        _emit({"name": self.name, "id": self.id, "parent": self.parent, "trace": self.trace,
+               "start": self.start, "duration_ms": ms, "attrs": self.attrs, "pid": os.getpid(),
+               "error": f"{exc_type.__name__}: {exc}" if exc_type else None})
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def incr(self, key, n=1):
+        self.attrs[key] = self.attrs.get(key, 0) + n
+
+def _emit(rec):
+    with _lock:
+        files = [_fh] if _fh is not None else []
+        for trace_id, sink, path, fh in _collectors:
+            if trace_id == rec["trace"]:
+                sink.append(rec)
+                if fh is not None and path != _path:
+                    files.append(fh)
+        if files:
+            line = json.dumps(rec, default=str) + "\n"
+            for fh in files:
+                fh.write(line)
+                fh.flush()
+
+def span(name, **attrs):
+    """Context manager timing ``name``; a no-op unless ``enabled()``."""
+    return Span(name, attrs) if _enabled or _trace.get() is not None else NOOP
+
+def traced(name=None):
+    """Decorator wrapping every call of the function in ``span(name)``."""
+    def deco(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled and _trace.get() is None:
+                return fn(*args, **kwargs)
+            with Span(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def enabled():
+    """Whether spans opened here are recorded: tracing is enabled or a ``collect()`` is open."""
+    return _enabled or _trace.get() is not None
+
+def enable(path=None):
+    """Turn tracing on for the whole process; spans are appended to ``path`` when given."""
+    global _enabled, _path, _fh
+    with _lock:
+        if path != _path:
+            if _fh is not None:
+                _fh.close()
+            _fh = None
+            if path:
+                d = os.path.dirname(path)
+                if d:
+                    os.makedirs(d, exist_ok=True)
+                _fh = open(path, "a", encoding="utf-8")
+            _path = path
+        _enabled = True
+
+def disable():
+    global _enabled, _path, _fh
+    with _lock:
+        _enabled = False
+        if _fh is not None:
+            _fh.close()
+        _fh, _path = None, None
+
+def submit(pool, fn, *args, **kwargs):
+    """``pool.submit`` that keeps the caller's span as the parent of spans opened in ``fn``."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def adopt(records):
+    """Re-emit spans recorded in another process (e.g. by a ``collect()`` in a pool worker) under
+    the current span, so they reach this process's trace file and open ``collect()`` blocks."""
+    if not enabled() or not records:
+        return
+    parent = _current.get()
+    ids = {r["id"] for r in records}
+    for r in records:
+        r = {**r, "trace": _trace.get()}
+        if r["parent"] not in ids:
+            r["parent"] = parent.id if parent is not None else None
+        _emit(r)
+
+@contextlib.contextmanager
+def collect(path=None):
+    """Record the spans finished inside this block (including ones opened in worker threads
+    started through ``submit``) into the yielded list, in completion order, and append them
+    to ``path`` when given. Tracing needs no ``enable()`` for this and stays off elsewhere."""
+    spans = []
+    fh = None
+    if path:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        fh = open(path, "a", encoding="utf-8")
+    trace_id = f"{os.getpid()}-{next(_ids)}"
+    token = _trace.set(trace_id)
+    entry = (trace_id, spans, path, fh)
+    with _lock:
+        _collectors.append(entry)
+    try:
+        yield spans
+    finally:
+        with _lock:
+            _collectors.remove(entry)
+            if fh is not None:
+                fh.close()
+        _trace.reset(token)
+
+def tree(spans):
+    """Spans ordered depth-first by start time, as (depth, span record) pairs."""
+    kids = {}
+    ids = {s["id"] for s in spans}
+    for s in sorted(spans, key=lambda s: s["start"]):
+        kids.setdefault(s["parent"] if s["parent"] in ids else None, []).append(s)
+    out = []
+    def walk(parent, depth):
+        for s in kids.get(parent, []):
+            out.append((depth, s))
+            walk(s["id"], depth + 1)
+    walk(None, 0)
+    return out
+
+if os.environ.get("RICE_TRACE"):
+    enable(os.environ["RICE_TRACE"])